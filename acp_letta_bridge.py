@@ -4,34 +4,136 @@ ACP-to-Letta Bridge Server
 Connects Zed Editor (ACP) to Letta Agents
 """
 
+import os
 import sys
+
+# Spawned by the editor: reply to initialize before the imports below,
+# which take most of the startup time (pydantic_settings above all)
+if __name__ == "__main__" and len(sys.argv) == 1:
+    from early_start import answer_initialize
+    EARLY_INPUT = answer_initialize()
+else:
+    EARLY_INPUT = b""
+
 import json
+import time
 import logging
 import asyncio
-from typing import Dict, Any, Optional
-from acp_protocol import ACPHandler
+import argparse
+import functools
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Set, Tuple
+from acp_protocol import ACPHandler, REQUEST_CANCELLED, PARSE_ERROR, INVALID_REQUEST, SERVER_NOT_READY
 from letta_wrapper import LettaClientWrapper
+from letta_messages import AgentResponse
 from config import BridgeConfig
+from transport import StdioTransport
+from codec import get_codec
+from response_cache import ResponseCache
+from agent_pool import AgentPool, Superseded, Turn, current_turn
+from batcher import MessageBatcher
+from prompt_builder import PromptBuilder
+from document_store import DocumentStore, line_edits, split_lines
+from early_start import initialize_result
+from dispatcher import MethodDispatcher
+from metrics import BridgeMetrics, MetricsExporter, RequestSpan, current_span, timed, charge
+from message_handler import MessageHandler
+from protocol import ACP_METHODS, BRIDGE_METHODS, METHOD_PRIORITIES, CONTROL_PRIORITY, AGENT_TURN_METHODS
 
-# Configure logging to stderr (stdout is for JSON-RPC)
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stderr
-)
 logger = logging.getLogger(__name__)
 
+# Version and text of the document an agent/edit in this task refers to,
+# taken when the request arrived
+edit_snapshot: ContextVar[Optional[Tuple[int, str]]] = ContextVar("edit_snapshot", default=None)
+
+
+def configure_logging(config: BridgeConfig):
+    """Log to stderr (stdout is for JSON-RPC) at the configured level"""
+    logging.basicConfig(
+        level=getattr(logging, config.log_level.upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
 
 class ACPLettaBridge:
     """Main bridge server connecting ACP to Letta"""
     
-    def __init__(self, config: BridgeConfig):
+    def __init__(
+        self,
+        config: BridgeConfig,
+        letta_client: Optional[LettaClientWrapper] = None,
+        response_cache: Optional[ResponseCache] = None,
+        agent_pool: Optional[AgentPool] = None,
+        metrics: Optional[BridgeMetrics] = None
+    ):
         self.config = config
         self.acp_handler = ACPHandler()
-        self.letta_client = LettaClientWrapper(config)
         self.agent_id: Optional[str] = None
         self.running = True
         
+        # In daemon mode the Letta client, agent pool, caches and metrics
+        # are shared across sessions and owned by the daemon
+        self._owns_client = letta_client is None
+        self.letta_client = letta_client or LettaClientWrapper(config)
+        
+        # Capture mode: log frames and Letta calls for replay.py
+        self.recorder = None
+        if config.record_path and self._owns_client:
+            from session_recorder import SessionRecorder, RecordingLettaClient
+            self.recorder = SessionRecorder(os.path.expanduser(config.record_path))
+            self.letta_client = RecordingLettaClient(self.letta_client, self.recorder)
+        self.agent_pool = agent_pool or AgentPool(config, self.letta_client)
+        
+        self.transport: Optional[StdioTransport] = None
+        self.codec = get_codec(config.json_codec)
+        self.metrics = metrics or BridgeMetrics()
+        self.response_cache = response_cache
+        if response_cache is None and config.enable_response_cache:
+            self.response_cache = ResponseCache(
+                max_size=config.response_cache_size,
+                ttl=config.response_cache_ttl
+            )
+        
+        self.prompt_builder = PromptBuilder(config)
+        self.documents = DocumentStore()
+        
+        # Method routing: MessageHandler's ACP methods plus the bridge's
+        # own, resolved once here
+        self.batcher: Optional[MessageBatcher] = None
+        if config.enable_batching:
+            self.batcher = MessageBatcher(
+                self.letta_client,
+                self.agent_pool,
+                window=config.batch_window_ms / 1000,
+                max_size=config.max_batch_size
+            )
+        self.message_handler = MessageHandler(self.letta_client, self.agent_pool, self.batcher)
+        self.dispatcher = MethodDispatcher(
+            max_concurrent=config.max_concurrent_requests,
+            method_limits=config.method_concurrency
+        )
+        self.dispatcher.register_table(self.message_handler, ACP_METHODS)
+        self.dispatcher.register_table(self, BRIDGE_METHODS)
+        
+        # Concurrent dispatch: each request runs as its own task; the
+        # pending semaphore pauses reading when too much work is queued
+        self._pending_slots = asyncio.Semaphore(config.max_pending_requests)
+        self._tasks: Set[asyncio.Task] = set()
+        self._inflight: Dict[Any, asyncio.Task] = {}  # request id -> task
+        self._request_agents: Dict[Any, str] = {}  # request id -> agent id
+        
+        # Memory blocks this session's editor has seen, by agent; only
+        # agents read through agent/memory get change notifications
+        self._memory_seen: Dict[str, Dict[str, str]] = {}  # agent id -> label -> value
+        self._memory_dirty: Set[str] = set()
+        self._memory_refreshes: Dict[str, asyncio.Task] = {}
+        
+        # Background Letta connect + agent resolution (stdio mode), so
+        # initialize is answered before the SDK is even imported or the
+        # server is reachable; agent requests await this task
+        self._startup: Optional[asyncio.Task] = None
+        
     async def initialize(self):
         """Initialize connection to Letta server"""
         logger.info("Initializing ACP-Letta Bridge...")
@@ -48,153 +150,580 @@ class ACPLettaBridge:
             }
         )
         
+        self.agent_pool.admit(self.agent_id, self.config.agent_name, pinned=True)
+        
         logger.info(f"Bridge initialized with agent: {self.agent_id}")
         
-    async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle incoming ACP JSON-RPC request"""
-        method = request.get("method")
-        params = request.get("params", {})
-        request_id = request.get("id")
+    async def initialize_with_retry(self):
+        """initialize(), retrying with exponential backoff until Letta is reachable"""
+        delay = self.config.startup_retry_initial
+        attempt = 1
+        while True:
+            try:
+                await self.initialize()
+                return
+            except Exception as e:
+                logger.warning(f"Bridge startup attempt {attempt} failed: {e}; retrying in {delay:g}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.config.startup_retry_max)
+            attempt += 1
+    
+    def start_initialize(self):
+        """Connect and resolve the agent in the background; agent requests wait for it"""
+        self._startup = asyncio.create_task(self.initialize_with_retry())
+    
+    async def serve(self, transport: StdioTransport):
+        """Read frames from the transport and dispatch them until EOF or shutdown"""
+        self.transport = transport
+        self.letta_client.memory_listeners.append(self._on_memory_updated)
+        while self.running:
+            body = await transport.read_message()
+            if body is None:
+                break
+            received = time.perf_counter()
+            try:
+                request = self.codec.loads(body)
+            except ValueError as e:
+                if self.recorder is not None:
+                    self.recorder.record("in", raw=body.decode("utf-8", errors="replace"))
+                logger.warning(f"Dropping malformed frame: {e}")
+                await self.write_message(
+                    self.acp_handler.error_response(None, "Parse error", code=PARSE_ERROR)
+                )
+                continue
+            if self.recorder is not None:
+                self.recorder.record("in", message=request)
+            if not isinstance(request, dict):
+                await self.write_message(
+                    self.acp_handler.error_response(None, "Invalid Request", code=INVALID_REQUEST)
+                )
+                continue
+            
+            span = RequestSpan(str(request.get("method")), received - transport.last_read_time)
+            span.add("read", transport.last_read_time)
+            span.queued_at = time.perf_counter()
+            span.add("decode", span.queued_at - received)
+            
+            # Handle request in its own task; blocks here only when
+            # max_concurrent_requests are already in flight
+            await self.dispatch(request, span)
+            
+            # Stop reading once shutdown is in flight
+            if request.get("method") == "shutdown":
+                break
         
-        logger.debug(f"Received request: {method}")
+        await self.drain()
+        if self.batcher is not None:
+            await self.batcher.close()
+        # Disconnect only now: shutdown arrives while earlier requests
+        # may still be queued or calling Letta
+        if not self.running and self._owns_client:
+            await self.letta_client.disconnect()
+        self.letta_client.memory_listeners.remove(self._on_memory_updated)
+        for task in list(self._memory_refreshes.values()):
+            task.cancel()
+        if self.recorder is not None:
+            self.recorder.close()
+    
+    async def dispatch(self, request: Dict[str, Any], span: Optional[RequestSpan] = None):
+        """Schedule a request as its own task, waiting for queue room first"""
+        # Control methods (cancel, shutdown) never wait for queue room
+        counted = METHOD_PRIORITIES.get(request.get("method")) != CONTROL_PRIORITY
+        if counted:
+            await self._pending_slots.acquire()
+        task = asyncio.create_task(self._process_request(request, span))
+        request_id = request.get("id")
+        if request_id is not None:
+            self._inflight[request_id] = task
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._request_done, request_id, counted))
+    
+    def _request_done(self, request_id: Any, counted: bool, task: asyncio.Task):
+        """Release the queue slot held by a finished request task"""
+        self._tasks.discard(task)
+        if request_id is not None and self._inflight.get(request_id) is task:
+            del self._inflight[request_id]
+        if counted:
+            self._pending_slots.release()
+    
+    async def _process_request(self, request: Dict[str, Any], span: Optional[RequestSpan] = None):
+        """Handle a single request, write its response and record its span"""
+        # Set in this task's own context; Letta calls and writes add to it
+        current_span.set(span)
+        try:
+            response = await self.handle_request(request)
+        except asyncio.CancelledError:
+            logger.info(f"Request {request.get('id')} cancelled")
+            response = self.acp_handler.error_response(
+                request.get("id"), "Request cancelled", code=REQUEST_CANCELLED
+            )
+        # Notifications (no id) get no response
+        if "id" in request:
+            await self.write_message(response)
+        if span is not None:
+            span.add("total", time.perf_counter() - span.started)
+            self.metrics.record(span, error="error" in response)
+    
+    async def write_message(self, message: Dict[str, Any]):
+        """Encode a JSON-RPC message and write it through the transport"""
+        if self.recorder is not None:
+            self.recorder.record("out", message=message)
+        with timed("encode"):
+            body = self.codec.dumps(message)
+        await self.transport.write_frame(body)
+    
+    async def drain(self):
+        """Wait for all in-flight requests to finish"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
         
+    async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle incoming ACP JSON-RPC request"""
+        # Edits refer to the document as the client saw it when sending,
+        # not as it is once the edit's turn comes up
+        snapshot_token = edit_snapshot.set(self._snapshot_document(request))
         try:
-            if method == "initialize":
-                result = await self._handle_initialize(params)
-            elif method == "agent/complete":
-                result = await self._handle_complete(params)
-            elif method == "agent/edit":
-                result = await self._handle_edit(params)
-            elif method == "agent/cancel":
-                result = await self._handle_cancel(params)
-            elif method == "shutdown":
-                result = await self._handle_shutdown(params)
-                self.running = False
-            else:
-                raise Exception(f"Unknown method: {method}")
-                
-            return self.acp_handler.success_response(request_id, result)
+            # Control methods (initialize, cancel, shutdown) never wait for startup
+            if (self._startup is not None and not self._startup.done()
+                    and METHOD_PRIORITIES.get(request.get("method")) != CONTROL_PRIORITY):
+                try:
+                    await asyncio.wait_for(asyncio.shield(self._startup), self.config.startup_wait_timeout)
+                except asyncio.TimeoutError:
+                    return self.acp_handler.error_response(
+                        request.get("id"),
+                        "Letta server is not reachable yet; still retrying",
+                        code=SERVER_NOT_READY
+                    )
             
-        except Exception as e:
-            logger.error(f"Error handling {method}: {e}", exc_info=True)
-            return self.acp_handler.error_response(request_id, str(e))
+            # Remember the agent so agent/cancel aborts the right agent's run
+            request_id = request.get("id")
+            agent_id = self._request_agent(request)
+            if agent_id is not None and request_id is not None:
+                self._request_agents[request_id] = agent_id
+            
+            # Queue agent requests behind the agent's earlier ones now, in
+            # arrival order; the dispatcher reorders by priority only after
+            turn = self._reserve_turn(request, agent_id)
+            token = current_turn.set(turn)
+            try:
+                return await self.dispatcher.call(request)
+            finally:
+                current_turn.reset(token)
+                if turn is not None:
+                    turn.abandon()
+                if request_id is not None:
+                    self._request_agents.pop(request_id, None)
+        finally:
+            edit_snapshot.reset(snapshot_token)
+    
+    def _snapshot_document(self, request: Dict[str, Any]) -> Optional[Tuple[int, str]]:
+        """Version and text an agent/edit by uri refers to; None if it sends its code"""
+        params = request.get("params")
+        if request.get("method") != "agent/edit" or not isinstance(params, dict):
+            return None
+        uri = params.get("uri")
+        if uri is None or "code" in params:
+            return None
+        try:
+            document = self.documents.get(uri)
+            version = params.get("version", document.version)
+            return version, document.at(version)
+        except ValueError:
+            # Unknown document or version: the handler reports it
+            return None
+    
+    def _request_agent(self, request: Dict[str, Any]) -> Optional[str]:
+        """Agent an agent request will run on, if known when it arrives"""
+        method = request.get("method")
+        params = request.get("params")
+        if method not in AGENT_TURN_METHODS or not isinstance(params, dict):
+            return None
+        field = AGENT_TURN_METHODS[method]
+        if field is not None:
+            agent_id = params.get(field)
+        elif params.get("agent"):
+            # Agents not yet created are resolved, and queued, by the handler
+            agent_id = self.agent_pool.find(params["agent"])
+        else:
+            agent_id = self.agent_id
+        return agent_id if isinstance(agent_id, str) else None
+    
+    def _reserve_turn(self, request: Dict[str, Any], agent_id: Optional[str]) -> Optional[Turn]:
+        """Place an agent request in its agent's queue, if it will take a turn"""
+        # Batched messages share a turn taken at flush time
+        if agent_id is None or self.batcher is not None:
+            return None
+        method = request["method"]
+        params = request["params"]
+        coalesce_key = None
+        if method == "agent/complete":
+            # Cached completions are answered without taking a turn
+            if self.response_cache is not None and self._completion_key(agent_id, params) in self.response_cache:
+                return None
+            coalesce_key = self._coalesce_key(params)
+        try:
+            return self.agent_pool.reserve(agent_id, coalesce_key)
+        except RuntimeError:
+            # Pool full; the handler's own attempt fails with a JSON-RPC error
+            return None
     
     async def _handle_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Handle ACP initialize request"""
-        return {
-            "protocolVersion": "0.1.0",
-            "capabilities": {
-                "completion": True,
-                "edit": True,
-                "memory": True
-            },
-            "serverInfo": {
-                "name": "Letta Agent",
-                "version": "1.0.0"
-            }
-        }
+        return initialize_result(self.config.enable_streaming, self.config.memory_notifications)
+    
+    async def _agent_for(self, params: Dict[str, Any]) -> str:
+        """Agent id for a request: params.agent names a pooled agent, else the default"""
+        agent_name = params.get("agent")
+        if agent_name:
+            return await self.agent_pool.resolve(agent_name)
+        return self.agent_id
+    
+    @staticmethod
+    def _completion_key(agent_id: str, params: Dict[str, Any]) -> str:
+        """Response cache key of a completion request; every param may shape the prompt"""
+        return ResponseCache.make_key(agent_id, "agent/complete", params)
+    
+    @staticmethod
+    def _coalesce_key(params: Dict[str, Any]) -> Optional[tuple]:
+        """Completions at the same file and cursor line replace older queued ones"""
+        context = params.get("context") or {}
+        if not isinstance(context, dict):
+            return None
+        file_path = params.get("filePath") or context.get("filePath") or context.get("file")
+        cursor = params.get("cursor", context.get("cursor", context.get("position")))
+        if not file_path or cursor is None:
+            return None
+        line = cursor.get("line") if isinstance(cursor, dict) else cursor
+        return ("agent/complete", file_path, json.dumps(line))
     
-    async def _handle_complete(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _send_to_agent(
+        self,
+        agent_id: str,
+        message: str,
+        request_id: Any,
+        coalesce_key: Optional[tuple] = None
+    ) -> AgentResponse:
+        """Send a message to an agent, streaming chunks when enabled"""
+        if request_id is not None:
+            self._request_agents[request_id] = agent_id
+        
+        # Batches take the agent's turn themselves
+        if self.batcher is not None and not self.config.enable_streaming:
+            return await self.batcher.send(agent_id, message, coalesce_key)
+        
+        async with self.agent_pool.use(agent_id, coalesce_key):
+            if not self.config.enable_streaming:
+                return await self.letta_client.send_message(agent_id, message)
+            
+            async def forward(text: str):
+                await self.write_message(self.acp_handler.notification(
+                    "agent/streamChunk",
+                    {"requestId": request_id, "delta": text}
+                ))
+            
+            return await self.letta_client.stream_message(agent_id, message, forward)
+    
+    async def _handle_complete(self, params: Dict[str, Any], request_id: Any = None) -> Dict[str, Any]:
         """Handle code completion request"""
-        prompt = params.get("prompt", "")
-        context = params.get("context", {})
+        agent_id = await self._agent_for(params)
         
-        # Build message with context
-        message = f"""Code completion request:
-{prompt}
-
-Context: {json.dumps(context)}"""
+        # Identical completions on unchanged code skip the Letta round-trip
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self._completion_key(agent_id, params)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return {
+                    "completion": cached.get("text", ""),
+                    "metadata": {
+                        "agent_id": agent_id,
+                        "memory_updated": False,
+                        "cached": True
+                    }
+                }
         
-        # Send to Letta agent
-        response = await self.letta_client.send_message(self.agent_id, message)
+        # Build message with context, trimmed to the prompt budget
+        prompt_info = self.prompt_builder.completion(params)
         
-        return {
-            "completion": response.get("text", ""),
-            "metadata": {
-                "agent_id": self.agent_id,
-                "memory_updated": response.get("memory_updated", False)
+        # Send to Letta agent; a newer completion at the same spot
+        # replaces this one if it is still queued
+        try:
+            response = await self._send_to_agent(
+                agent_id, prompt_info.message, request_id, self._coalesce_key(params)
+            )
+        except Superseded:
+            return {
+                "completion": "",
+                "superseded": True,
+                "metadata": {
+                    "agent_id": agent_id,
+                    "memory_updated": False
+                }
             }
+        
+        charge(agent_id, response.usage)
+        if cache_key is not None:
+            self.response_cache.put(cache_key, {"text": response.text})
+        
+        metadata = {
+            "agent_id": agent_id,
+            "memory_updated": response.memory_updated,
+            "prompt": prompt_info.metadata()
+        }
+        if response.usage is not None:
+            metadata["usage"] = response.usage.to_dict()
+        return {
+            "completion": response.text,
+            "metadata": metadata
         }
     
-    async def _handle_edit(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_edit(self, params: Dict[str, Any], request_id: Any = None) -> Dict[str, Any]:
         """Handle code editing request"""
-        instruction = params.get("instruction", "")
-        code = params.get("code", "")
-        file_path = params.get("filePath", "")
-        
-        # Build edit request for Letta
-        message = f"""Edit request:
-File: {file_path}
-Instruction: {instruction}
-
-Current code:
-{code}
-
-Please provide the edited code."""
+        agent_id = await self._agent_for(params)
+        
+        # A request naming an open document instead of sending its code
+        # is answered with text edits against that version
+        uri = params.get("uri")
+        document_mode = uri is not None and "code" not in params
+        if document_mode:
+            snapshot = edit_snapshot.get()
+            if snapshot is not None:
+                version, original = snapshot
+            else:
+                document = self.documents.get(uri)
+                version = params.get("version", document.version)
+                original = document.at(version)
+            params = dict(params, code=original, filePath=params.get("filePath", uri))
+        
+        # Build edit request for Letta; large files are cut to a window
+        # around the edit region
+        prompt_info = self.prompt_builder.edit(params)
         
         # Send to Letta agent
-        response = await self.letta_client.send_message(self.agent_id, message)
+        response = await self._send_to_agent(agent_id, prompt_info.message, request_id)
+        charge(agent_id, response.usage)
         
-        return {
-            "edit": response.get("text", ""),
-            "metadata": {
-                "agent_id": self.agent_id,
-                "memory_updated": response.get("memory_updated", False)
+        metadata = {
+            "agent_id": agent_id,
+            "memory_updated": response.memory_updated,
+            "prompt": prompt_info.metadata()
+        }
+        if response.usage is not None:
+            metadata["usage"] = response.usage.to_dict()
+        if prompt_info.window is not None:
+            # The agent saw and rewrote only these lines of the original code
+            metadata["edit_range"] = {
+                "start_line": prompt_info.window[0],
+                "end_line": prompt_info.window[1]
+            }
+        edited = self._unfence(response.text)
+        if document_mode:
+            return {
+                "uri": uri,
+                "version": version,
+                "edits": self._edits_for(original, edited, prompt_info.window),
+                "metadata": metadata
             }
+        if prompt_info.window is not None:
+            edited = self._splice(params.get("code", ""), edited, prompt_info.window)
+        return {
+            "edit": edited,
+            "metadata": metadata
         }
     
+    @staticmethod
+    def _unfence(text: str) -> str:
+        """The code inside a reply that is a single markdown code block, else the reply"""
+        stripped = text.strip()
+        if len(stripped) < 6 or not (stripped.startswith("```") and stripped.endswith("```")):
+            return text
+        # Drop the opening fence line with its language tag
+        newline = stripped.find("\n")
+        if newline < 0:
+            return text
+        return stripped[newline + 1:-3]
+    
+    @staticmethod
+    def _splice(code: str, edited: str, window: tuple) -> str:
+        """The whole code with its prompt window replaced by the agent's version of it"""
+        lines = code.split("\n")
+        start, end = window
+        # The window ends in a newline only when it runs to the end of the code
+        if end < len(lines) and edited.endswith("\n"):
+            edited = edited[:-1]
+        elif end >= len(lines) and code.endswith("\n") and not edited.endswith("\n"):
+            edited += "\n"
+        return "\n".join(lines[:start] + [edited] + lines[end:])
+    
+    @staticmethod
+    def _edits_for(original: str, edited: str, window: Optional[tuple]) -> list:
+        """Text edits turning the original (or its prompt window) into the agent's version"""
+        lines = split_lines(original)
+        start, end = window if window is not None else (0, len(lines))
+        old = "".join(lines[start:end])
+        if old.endswith("\n") and not edited.endswith("\n"):
+            edited += "\n"
+        return line_edits(old, edited, start, at_end=end >= len(lines))
+    
+    async def _handle_document_open(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Start tracking a document's text"""
+        document = self.documents.open(params["uri"], params.get("text", ""), params.get("version", 0))
+        return {"uri": document.uri, "version": document.version}
+    
+    async def _handle_document_change(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply incremental content changes to a tracked document"""
+        document = self.documents.change(params["uri"], params["version"], params.get("changes", []))
+        return {"uri": document.uri, "version": document.version}
+    
+    async def _handle_document_close(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Stop tracking a document"""
+        return {"uri": params.get("uri"), "closed": self.documents.close(params.get("uri"))}
+    
     async def _handle_cancel(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Handle request cancellation"""
-        return {"status": "cancelled"}
+        target = params.get("id", params.get("requestId"))
+        task = self._inflight.get(target)
+        if task is None or task.done():
+            return {"status": "not_found", "id": target}
+        
+        agent_id = self._request_agents.get(target, self.agent_id)
+        task.cancel()
+        # Let the cancelled request leave its agent's queue first
+        await asyncio.wait([task])
+        
+        # Abort the agent's server-side run as well; runs are cancelled per
+        # agent, so skip it while any session still has requests on it
+        if not self.agent_pool.inflight(agent_id):
+            await self.letta_client.cancel_runs(agent_id)
+        
+        return {"status": "cancelled", "id": target}
+    
+    async def _handle_agent_pool(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Report agent pool occupancy"""
+        return self.agent_pool.stats()
+    
+    async def _handle_metrics(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Latency quantiles per method and agent; format=prometheus for text"""
+        if params.get("format") == "prometheus":
+            return {"text": self.metrics.prometheus_text()}
+        return self.metrics.snapshot()
+    
+    async def _handle_memory(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Agent's core memory blocks; later edits arrive as agent/memoryChanged"""
+        agent_id = params.get("agent_id") or await self._agent_for(params)
+        blocks = await self.letta_client.get_agent_memory(agent_id, refresh=params.get("refresh", False))
+        self._memory_seen[agent_id] = {label: block.value for label, block in blocks.items()}
+        return {
+            "agent_id": agent_id,
+            "blocks": [block.to_dict() for block in blocks.values()]
+        }
+    
+    def _on_memory_updated(self, agent_id: str):
+        """Memory listener: schedule a refresh if this session shows the agent's memory"""
+        if not self.config.memory_notifications or agent_id not in self._memory_seen:
+            return
+        self._memory_dirty.add(agent_id)
+        if agent_id not in self._memory_refreshes:
+            self._memory_refreshes[agent_id] = asyncio.create_task(self._push_memory(agent_id))
+    
+    async def _push_memory(self, agent_id: str):
+        """Refetch the agent's memory and notify the editor of the blocks that changed"""
+        try:
+            # Edits landing while a fetch is in flight trigger one more
+            while agent_id in self._memory_dirty:
+                self._memory_dirty.discard(agent_id)
+                blocks = await self.letta_client.get_agent_memory(agent_id)
+                seen = self._memory_seen.get(agent_id, {})
+                changed = [block.to_dict() for label, block in blocks.items() if seen.get(label) != block.value]
+                removed = [label for label in seen if label not in blocks]
+                self._memory_seen[agent_id] = {label: block.value for label, block in blocks.items()}
+                if changed or removed:
+                    await self.write_message(self.acp_handler.notification(
+                        "agent/memoryChanged",
+                        {"agentId": agent_id, "blocks": changed, "removed": removed}
+                    ))
+        except Exception as e:
+            logger.warning(f"Could not refresh memory for agent {agent_id}: {e}")
+        finally:
+            self._memory_refreshes.pop(agent_id, None)
+    
+    async def _handle_usage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Letta token and step totals per method and agent; agent_id narrows the agents"""
+        return self.metrics.usage(params.get("agent_id"))
     
     async def _handle_shutdown(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Handle shutdown request"""
         logger.info("Shutting down bridge...")
-        await self.letta_client.disconnect()
+        self.running = False
+        if self._startup is not None:
+            self._startup.cancel()
+        # serve() disconnects from Letta once in-flight requests drain
         return {"status": "shutdown"}
 
 
-async def main():
-    """Main entry point"""
+async def main(early_input: bytes = b""):
+    """Main entry point; early_input is stdin already read by answer_initialize"""
     config = BridgeConfig()
+    configure_logging(config)
     bridge = ACPLettaBridge(config)
+    exporter = MetricsExporter(
+        bridge.metrics, config.metrics_file, config.metrics_port, config.metrics_interval
+    )
     
     try:
-        # Initialize bridge
-        await bridge.initialize()
-        
-        # Main event loop - read from stdin, write to stdout
-        while bridge.running:
-            # Read Content-Length header
-            line = sys.stdin.readline()
-            if not line:
-                break
-                
-            if line.startswith("Content-Length:"):
-                content_length = int(line.split(":")[1].strip())
-                
-                # Read empty line
-                sys.stdin.readline()
-                
-                # Read JSON body
-                body = sys.stdin.read(content_length)
-                request = json.loads(body)
-                
-                # Handle request
-                response = await bridge.handle_request(request)
-                
-                # Write response with Content-Length
-                response_body = json.dumps(response)
-                sys.stdout.write(f"Content-Length: {len(response_body)}\r\n\r\n")
-                sys.stdout.write(response_body)
-                sys.stdout.flush()
+        # Connect to Letta in the background so initialize is answered
+        # as soon as the editor sends it
+        bridge.start_initialize()
+        await exporter.start()
+        
+        # Main event loop - read frames from stdin, dispatch concurrently
+        transport = await StdioTransport.open_stdio()
+        transport.decoder.feed(early_input)
+        await bridge.serve(transport)
                 
     except KeyboardInterrupt:
         logger.info("Received interrupt, shutting down...")
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        await exporter.stop()
+
+
+def parse_args():
+    """Command line options for the entry point"""
+    parser = argparse.ArgumentParser(description="ACP-to-Letta Bridge Server")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--serve", action="store_true",
+        help="run as a shared daemon serving many editor sessions"
+    )
+    mode.add_argument(
+        "--connect", action="store_true",
+        help="forward stdio to a running daemon (falls back to in-process)"
+    )
+    mode.add_argument(
+        "--profile-startup", action="store_true",
+        help="report per-module import time and time to the initialize reply"
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.profile_startup:
+        from startup_profile import profile_startup
+        profile_startup()
+    elif args.serve:
+        from daemon import serve_daemon
+        config = BridgeConfig()
+        configure_logging(config)
+        asyncio.run(serve_daemon(config))
+    elif args.connect:
+        from daemon import run_shim
+        config = BridgeConfig()
+        configure_logging(config)
+        if not asyncio.run(run_shim(config)):
+            asyncio.run(main())
+    else:
+        asyncio.run(main(EARLY_INPUT))
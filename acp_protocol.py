@@ -5,6 +5,15 @@ Implements JSON-RPC protocol for Zed editor communication
 
 from typing import Dict, Any, Optional
 
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SERVER_NOT_READY = -32002  # LSP ServerNotInitialized: Letta not reachable yet
+REQUEST_CANCELLED = -32800  # LSP extension, also used by ACP clients
+
 
 class ACPHandler:
     """Handle ACP JSON-RPC protocol"""
@@ -19,7 +28,7 @@ class ACPHandler:
         }
     
     @staticmethod
-    def error_response(request_id: Optional[int], error_message: str, code: int = -32603) -> Dict[str, Any]:
+    def error_response(request_id: Optional[int], error_message: str, code: int = INTERNAL_ERROR) -> Dict[str, Any]:
         """Build error JSON-RPC response"""
         return {
             "jsonrpc": "2.0",
@@ -0,0 +1,66 @@
+"""
+Agent ID cache
+Persistent name -> agent_id map so warm starts skip the agent list scan
+"""
+
+import os
+import json
+import logging
+import tempfile
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AgentIdCache:
+    """On-disk cache of resolved agent ids, scoped per Letta server"""
+
+    def __init__(self, path: str, base_url: str):
+        self.path = os.path.expanduser(path)
+        self.base_url = base_url
+        self._entries: Optional[Dict[str, str]] = None
+
+    def _key(self, agent_name: str) -> str:
+        return f"{self.base_url}#{agent_name}"
+
+    def _load(self) -> Dict[str, str]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable agent cache {self.path}: {e}")
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        # Write to a temp file and rename so concurrent bridges never read
+        # a partial file
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write agent cache {self.path}: {e}")
+
+    def get(self, agent_name: str) -> Optional[str]:
+        """Cached agent id for a name, if any"""
+        return self._load().get(self._key(agent_name))
+
+    def put(self, agent_name: str, agent_id: str):
+        """Remember a resolved agent id"""
+        entries = self._load()
+        if entries.get(self._key(agent_name)) != agent_id:
+            entries[self._key(agent_name)] = agent_id
+            self._save()
+
+    def discard(self, agent_name: str):
+        """Forget a stale agent id"""
+        entries = self._load()
+        if entries.pop(self._key(agent_name), None) is not None:
+            self._save()
@@ -0,0 +1,302 @@
+"""
+Agent Pool
+Route requests to named agents with per-agent limits and LRU eviction
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, AsyncIterator, Deque, Hashable, Tuple, List
+
+from config import BridgeConfig
+from letta_wrapper import LettaClientWrapper, abandoned_calls
+from metrics import current_span, timed
+
+logger = logging.getLogger(__name__)
+
+
+class Superseded(Exception):
+    """A queued request was replaced by a newer one for the same target"""
+
+
+class AgentQueue:
+    """
+    FIFO admission to one agent
+
+    Letta agents are stateful, so requests start in arrival order with
+    at most `width` running at once. A request queued with a coalescing
+    key drops any older, not yet started request with the same key.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.active = 0
+        self.dropped = 0
+        self._waiting: Deque[Tuple[Optional[Hashable], asyncio.Future]] = deque()
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for _, future in self._waiting if not future.done())
+
+    def reserve(self, coalesce_key: Optional[Hashable] = None) -> asyncio.Future:
+        """Take a place in line now; the future resolves when the turn is granted"""
+        if coalesce_key is not None:
+            self._supersede(coalesce_key)
+        future = asyncio.get_running_loop().create_future()
+        if self.active < self.width and not self.depth:
+            self.active += 1
+            future.set_result(None)
+        else:
+            self._waiting.append((coalesce_key, future))
+        return future
+
+    async def acquire(self, coalesce_key: Optional[Hashable] = None):
+        """Wait for this request's turn; raises Superseded if replaced first"""
+        await self.wait(self.reserve(coalesce_key))
+
+    async def wait(self, future: asyncio.Future):
+        """Wait for a reserved place to become the running turn"""
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.forfeit(future)
+            raise
+
+    def forfeit(self, future: asyncio.Future):
+        """Give up a reserved place; a turn already handed over goes to the next waiter"""
+        if not future.done():
+            future.cancel()
+        # A future failed with Superseded never held a turn
+        elif not future.cancelled() and future.exception() is None:
+            self.release()
+
+    def release(self):
+        """Hand the running slot to the next live waiter"""
+        while self._waiting:
+            _, future = self._waiting.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _supersede(self, coalesce_key: Hashable):
+        for key, future in self._waiting:
+            if key == coalesce_key and not future.done():
+                future.set_exception(Superseded())
+                self.dropped += 1
+
+
+class Turn:
+    """
+    A request's place in its agent's queue, taken when the request arrives
+
+    Reserving on arrival keeps each agent's requests in arrival order even
+    though the dispatcher later schedules them by method priority.
+    """
+
+    __slots__ = ("agent_id", "entry", "future", "claimed")
+
+    def __init__(self, agent_id: str, entry: "PooledAgent", future: asyncio.Future):
+        self.agent_id = agent_id
+        self.entry = entry
+        self.future = future
+        self.claimed = False
+
+    async def ready(self):
+        """Wait until the turn is granted or superseded, without claiming it"""
+        if not self.future.done():
+            await asyncio.wait([self.future])
+
+    def abandon(self):
+        """Give the place back if the request ended without using it"""
+        if self.claimed:
+            return
+        self.claimed = True
+        self.entry.queue.forfeit(self.future)
+        self.entry.inflight -= 1
+        self.entry.last_used = time.monotonic()
+
+
+# The turn reserved for the request running in the current task
+current_turn: ContextVar[Optional[Turn]] = ContextVar("current_turn", default=None)
+
+
+class PooledAgent:
+    """Bookkeeping for one agent held by the pool"""
+
+    __slots__ = ("agent_id", "name", "queue", "inflight", "last_used", "pinned")
+
+    def __init__(self, agent_id: str, name: str, max_inflight: int, pinned: bool = False):
+        self.agent_id = agent_id
+        self.name = name
+        self.queue = AgentQueue(max_inflight)
+        self.inflight = 0
+        self.last_used = time.monotonic()
+        self.pinned = pinned
+
+
+class AgentPool:
+    """
+    Bounded set of active agents
+
+    Holds at most max_agents entries. Agents idle for longer than
+    agent_timeout are dropped, and when the pool is full the least
+    recently used idle agent makes room. Each agent also has its own
+    FIFO queue with an in-flight cap, so requests to a stateful agent
+    keep their order and one busy agent cannot take every worker.
+    Eviction only forgets the agent locally; it is never deleted.
+    """
+
+    def __init__(self, config: BridgeConfig, letta_client: LettaClientWrapper):
+        self.config = config
+        self.letta = letta_client
+        self._agents: "OrderedDict[str, PooledAgent]" = OrderedDict()  # agent_id -> entry
+        self.evictions = 0
+
+    def admit(self, agent_id: str, name: Optional[str] = None, pinned: bool = False) -> PooledAgent:
+        """Add an agent (or refresh it), evicting others if needed"""
+        entry = self._agents.get(agent_id)
+        if entry is None:
+            self._evict_for_room()
+            entry = PooledAgent(
+                agent_id, name or agent_id, self.config.max_requests_per_agent, pinned
+            )
+            self._agents[agent_id] = entry
+        entry.pinned = entry.pinned or pinned
+        entry.last_used = time.monotonic()
+        self._agents.move_to_end(agent_id)
+        return entry
+
+    def find(self, name: str) -> Optional[str]:
+        """Id of a pooled agent by name, or None"""
+        for entry in self._agents.values():
+            if entry.name == name:
+                return entry.agent_id
+        return None
+
+    async def resolve(self, name: str) -> str:
+        """Agent id for a name, creating the agent on the server if needed"""
+        agent_id = self.find(name)
+        if agent_id is not None:
+            return agent_id
+        agent_id = await self.letta.get_or_create_agent(
+            agent_name=name,
+            agent_config={
+                "persona": "You are a helpful coding assistant with persistent memory.",
+                "tools": []
+            }
+        )
+        self.admit(agent_id, name)
+        return agent_id
+
+    def reserve(self, agent_id: str, coalesce_key: Optional[Hashable] = None) -> Turn:
+        """Queue a request for the agent's turn; use() in the same task claims it"""
+        entry = self.admit(agent_id)
+        # Queued requests count as in flight so the agent is not evicted
+        entry.inflight += 1
+        return Turn(agent_id, entry, entry.queue.reserve(coalesce_key))
+
+    @asynccontextmanager
+    async def use(self, agent_id: str, coalesce_key: Optional[Hashable] = None) -> AsyncIterator[str]:
+        """
+        Hold the agent's turn for the duration of a call
+
+        Uses the turn reserved for this request if there is one. Raises
+        Superseded if a newer request with the same coalesce_key arrives
+        before this one starts.
+        """
+        turn = current_turn.get()
+        if turn is not None and turn.agent_id == agent_id and not turn.claimed:
+            turn.claimed = True
+            entry, future = turn.entry, turn.future
+        else:
+            entry = self.admit(agent_id)
+            entry.inflight += 1
+            future = entry.queue.reserve(coalesce_key)
+        span = current_span.get()
+        if span is not None:
+            span.agent_id = agent_id
+        try:
+            with timed("queue"):
+                await entry.queue.wait(future)
+        except BaseException:
+            self._done(entry, release=False)
+            raise
+        abandoned: List[asyncio.Future] = []
+        token = abandoned_calls.set(abandoned)
+        try:
+            yield agent_id
+        finally:
+            abandoned_calls.reset(token)
+            running = [call for call in abandoned if not call.done()]
+            if running:
+                # A timed-out or cancelled SDK call is still talking to the
+                # agent; the next request waits until it really returns
+                waiter = asyncio.gather(*running, return_exceptions=True)
+                waiter.add_done_callback(lambda _: self._done(entry))
+            else:
+                self._done(entry)
+
+    @staticmethod
+    def _done(entry: PooledAgent, release: bool = True):
+        """End a request's hold on the agent"""
+        if release:
+            entry.queue.release()
+        entry.inflight -= 1
+        entry.last_used = time.monotonic()
+
+    def _evict_for_room(self):
+        """Drop expired idle agents, then LRU idle agents until one slot is free"""
+        now = time.monotonic()
+        for entry in list(self._agents.values()):
+            if self._evictable(entry) and now - entry.last_used > self.config.agent_timeout:
+                self._evict(entry)
+
+        while len(self._agents) >= self.config.max_agents:
+            victim = next((e for e in self._agents.values() if self._evictable(e)), None)
+            if victim is None:
+                raise RuntimeError(
+                    f"Agent pool full: all {self.config.max_agents} agents have requests in flight"
+                )
+            self._evict(victim)
+
+    @staticmethod
+    def _evictable(entry: PooledAgent) -> bool:
+        return entry.inflight == 0 and not entry.pinned
+
+    def _evict(self, entry: PooledAgent):
+        del self._agents[entry.agent_id]
+        if self.letta.agents.get(entry.name) == entry.agent_id:
+            del self.letta.agents[entry.name]
+        self.evictions += 1
+        logger.info(f"Evicted idle agent from pool: {entry.name} ({entry.agent_id})")
+
+    def inflight(self, agent_id: str) -> int:
+        """Requests queued or running on an agent, across all sessions sharing the pool"""
+        entry = self._agents.get(agent_id)
+        return entry.inflight if entry is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool occupancy"""
+        now = time.monotonic()
+        return {
+            "size": len(self._agents),
+            "max_agents": self.config.max_agents,
+            "busy": sum(1 for e in self._agents.values() if e.inflight),
+            "evictions": self.evictions,
+            "agents": [
+                {
+                    "agent_id": e.agent_id,
+                    "name": e.name,
+                    "running": e.queue.active,
+                    "queued": e.queue.depth,
+                    "superseded": e.queue.dropped,
+                    "max_inflight": self.config.max_requests_per_agent,
+                    "idle_seconds": round(now - e.last_used, 3) if not e.inflight else 0.0
+                }
+                for e in self._agents.values()
+            ]
+        }
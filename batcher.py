@@ -0,0 +1,169 @@
+"""
+Message Batcher
+Fold messages queued for the same agent into one Letta request
+"""
+
+import re
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Hashable, Set
+
+from agent_pool import AgentPool, Superseded
+from letta_messages import AgentResponse
+from letta_wrapper import LettaClientWrapper
+from metrics import current_span
+
+logger = logging.getLogger(__name__)
+
+BATCH_INSTRUCTION = (
+    "The following {count} messages are separate requests. Answer each one "
+    "in order. Start each answer with its marker line exactly as given, "
+    "e.g. [batch item 1], and write nothing before the first marker."
+)
+BATCH_MARKER = "[batch item {index}]"
+BATCH_MARKER_PATTERN = re.compile(r"^\s*\[batch item (\d+)\]\s*$", re.MULTILINE)
+
+
+class PendingMessage:
+    """A message waiting for its batch to be sent"""
+
+    __slots__ = ("message", "coalesce_key", "future")
+
+    def __init__(self, message: str, coalesce_key: Optional[Hashable], future: asyncio.Future):
+        self.message = message
+        self.coalesce_key = coalesce_key
+        self.future = future
+
+
+class MessageBatcher:
+    """
+    Collects messages per agent for a short window and sends them together
+
+    The batch takes a single turn in the agent's queue. Each message is
+    tagged with a marker, and the agent is asked to prefix each answer
+    with the same marker so the reply can be split back per request.
+    If the reply cannot be split, each message is resent on its own.
+    """
+
+    def __init__(self, letta_client: LettaClientWrapper, agent_pool: AgentPool,
+                 window: float, max_size: int):
+        self.letta = letta_client
+        self.pool = agent_pool
+        self.window = window
+        self.max_size = max_size
+        self._pending: Dict[str, List[PendingMessage]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        self.batches_sent = 0
+        self.messages_batched = 0
+        self.split_failures = 0
+
+    async def send(self, agent_id: str, message: str,
+                   coalesce_key: Optional[Hashable] = None) -> AgentResponse:
+        """Queue a message and wait for its share of the batched reply"""
+        loop = asyncio.get_running_loop()
+        batch = self._pending.setdefault(agent_id, [])
+
+        # A newer message at the same spot replaces one still waiting here
+        if coalesce_key is not None:
+            for pending in batch:
+                if pending.coalesce_key == coalesce_key and not pending.future.done():
+                    pending.future.set_exception(Superseded())
+            batch[:] = [p for p in batch if not p.future.done()]
+
+        pending = PendingMessage(message, coalesce_key, loop.create_future())
+        batch.append(pending)
+
+        if len(batch) >= self.max_size:
+            self._start_flush(agent_id)
+        elif agent_id not in self._timers:
+            self._timers[agent_id] = loop.call_later(self.window, self._start_flush, agent_id)
+
+        return await pending.future
+
+    def _start_flush(self, agent_id: str):
+        timer = self._timers.pop(agent_id, None)
+        if timer is not None:
+            timer.cancel()
+        batch = [p for p in self._pending.pop(agent_id, []) if not p.future.done()]
+        if batch:
+            # Held here: the event loop keeps only weak references to tasks
+            task = asyncio.create_task(self._flush(agent_id, batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def close(self):
+        """Send batches still collecting and wait for every batch in flight"""
+        for agent_id in list(self._pending):
+            self._start_flush(agent_id)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def _flush(self, agent_id: str, batch: List[PendingMessage]):
+        # The flush task inherits the triggering request's span; the batch
+        # belongs to every caller, so do not charge it to that one
+        current_span.set(None)
+        try:
+            async with self.pool.use(agent_id):
+                # Callers cancelled while the batch waited for its turn drop out
+                batch = [p for p in batch if not p.future.done()]
+                if not batch:
+                    return
+                if len(batch) == 1:
+                    batch[0].future.set_result(await self.letta.send_message(agent_id, batch[0].message))
+                    return
+
+                response = await self.letta.send_messages(agent_id, self._tag(batch))
+                self.batches_sent += 1
+                self.messages_batched += len(batch)
+                answers = self._split(response.text, len(batch))
+                if answers is None:
+                    # Never hand one caller another's answer; ask again
+                    # one message at a time, still within this turn
+                    self.split_failures += 1
+                    for pending in batch:
+                        if not pending.future.done():
+                            pending.future.set_result(await self.letta.send_message(agent_id, pending.message))
+                    return
+
+            for index, (pending, text) in enumerate(zip(batch, answers)):
+                if not pending.future.done():
+                    # The batch's token usage is reported once, on its first item
+                    pending.future.set_result(AgentResponse(
+                        text,
+                        response.reasoning,
+                        response.memory_updated,
+                        response.tool_calls,
+                        response.usage if index == 0 else None,
+                        batched=len(batch)
+                    ))
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+
+    @staticmethod
+    def _tag(batch: List[PendingMessage]) -> List[str]:
+        messages = [BATCH_INSTRUCTION.format(count=len(batch))]
+        for index, pending in enumerate(batch, 1):
+            messages.append(f"{BATCH_MARKER.format(index=index)}\n{pending.message}")
+        return messages
+
+    @staticmethod
+    def _split(text: str, count: int) -> Optional[List[str]]:
+        """Split a batched reply on its markers; None if any answer is missing"""
+        parts = BATCH_MARKER_PATTERN.split(text)
+        # parts = [preamble, index, answer, index, answer, ...]
+        answers = {int(index): answer.strip() for index, answer in zip(parts[1::2], parts[2::2])}
+        if sorted(answers) != list(range(1, count + 1)):
+            logger.warning("Batched reply could not be split per request; resending messages one by one")
+            return None
+        return [answers[index] for index in range(1, count + 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches_sent": self.batches_sent,
+            "messages_batched": self.messages_batched,
+            "split_failures": self.split_failures,
+            "pending": sum(len(b) for b in self._pending.values())
+        }
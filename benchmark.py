@@ -0,0 +1,344 @@
+"""
+Bridge benchmark
+Drive the bridge with mixed ACP traffic against a fake Letta server and report latency
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from framing import FrameDecoder, encode_frame
+from fake_letta import FakeLettaServer
+
+BRIDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+BRIDGE_SCRIPT = os.path.join(BRIDGE_DIR, "acp_letta_bridge.py")
+DEFAULT_MIX = {"agent/complete": 6, "agent/edit": 2, "agent/message": 2}
+
+
+class BridgeClient:
+    """Content-Length framed JSON-RPC client over an asyncio stream pair"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = FrameDecoder()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    async def call(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        request = {"jsonrpc": "2.0", "method": method, "params": params or {}, "id": request_id}
+        self.writer.write(encode_frame(json.dumps(request).encode("utf-8")))
+        await self.writer.drain()
+        return await future
+
+    async def _read_loop(self):
+        while True:
+            body = self.decoder.next_frame()
+            if body is None:
+                data = await self.reader.read(65536)
+                if not data:
+                    break
+                self.decoder.feed(data)
+                continue
+            message = json.loads(body)
+            # Notifications (stream chunks) carry no id
+            future = self._pending.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Bridge closed the connection"))
+
+    async def close(self):
+        self._read_task.cancel()
+        self.writer.close()
+
+
+async def _open_stdio(env: Dict[str, str]) -> Tuple[BridgeClient, asyncio.subprocess.Process]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, BRIDGE_SCRIPT,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env
+    )
+    return BridgeClient(process.stdout, process.stdin), process
+
+
+async def _open_daemon(env: Dict[str, str], socket_path: str) -> Tuple[BridgeClient, asyncio.subprocess.Process]:
+    env = dict(env, BRIDGE_DAEMON_SOCKET=socket_path)
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, BRIDGE_SCRIPT, "--serve",
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+        env=env
+    )
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            return BridgeClient(reader, writer), process
+        except OSError:
+            if time.monotonic() > deadline or process.returncode is not None:
+                raise RuntimeError("Bridge daemon did not start listening")
+            await asyncio.sleep(0.05)
+
+
+def _params(method: str, agent_name: str, agent_id: str, rng: random.Random, index: int) -> Dict[str, Any]:
+    """Request params for one call, sized like typical editor traffic"""
+    if method == "agent/complete":
+        line = rng.randrange(200)
+        return {
+            "agent": agent_name,
+            "prompt": f"def handler_{index}(request):\n    ",
+            "context": {"filePath": f"src/module_{index % 7}.py", "cursor": {"line": line, "character": 4}}
+        }
+    if method == "agent/edit":
+        code = "\n".join(f"    value_{i} = compute({i})" for i in range(rng.randrange(20, 120)))
+        return {
+            "agent": agent_name,
+            "instruction": "Add type hints",
+            "filePath": f"src/module_{index % 7}.py",
+            "code": f"def build():\n{code}\n    return value_0\n"
+        }
+    return {"agent_id": agent_id, "message": f"Explain request {index} briefly."}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BRIDGE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(
+    requests: int = 200,
+    concurrency: int = 8,
+    agents: int = 4,
+    mix: Optional[Dict[str, int]] = None,
+    mode: str = "stdio",
+    latency: float = 0.05,
+    token_rate: float = 400.0,
+    reply_tokens: int = 40,
+    failure_rate: float = 0.0,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Run one benchmark and return its report"""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    fake = FakeLettaServer(latency, token_rate, reply_tokens, failure_rate, seed=seed)
+    base_url = fake.start()
+    env = dict(
+        os.environ,
+        BRIDGE_LETTA_BASE_URL=base_url,
+        BRIDGE_AGENT_NAME="bench_default",
+        BRIDGE_AGENT_CACHE_PATH="",
+        BRIDGE_ENABLE_RESPONSE_CACHE="false",
+        BRIDGE_MAX_AGENTS=str(agents + 2),
+        BRIDGE_LOG_LEVEL="WARNING"
+    )
+
+    tmp = tempfile.TemporaryDirectory()
+    started = time.perf_counter()
+    if mode == "daemon":
+        client, process = await _open_daemon(env, os.path.join(tmp.name, "bridge.sock"))
+    else:
+        client, process = await _open_stdio(env)
+
+    try:
+        await client.call("initialize")
+        initialize_ms = (time.perf_counter() - started) * 1000
+
+        names = [f"bench-agent-{i}" for i in range(agents)]
+        ids = []
+        for name in names:
+            created = await client.call("agent/create", {"name": name, "instructions": "Benchmark agent"})
+            ids.append(created["result"]["agent_id"])
+
+        methods = list(mix)
+        plan = rng.choices(methods, weights=[mix[m] for m in methods], k=requests)
+        results: List[Tuple[str, float, bool]] = []
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(index: int, method: str):
+            slot = index % agents
+            params = _params(method, names[slot], ids[slot], rng, index)
+            async with slots:
+                sent = time.perf_counter()
+                response = await client.call(method, params)
+                results.append((method, time.perf_counter() - sent, "error" in response))
+
+        load_started = time.perf_counter()
+        await asyncio.gather(*[one(i, m) for i, m in enumerate(plan)])
+        duration = time.perf_counter() - load_started
+
+        bridge_metrics = (await client.call("bridge/metrics"))["result"]
+        await client.call("shutdown")
+    finally:
+        await client.close()
+        if mode == "daemon" and process.returncode is None:
+            process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            process.kill()
+        fake.stop()
+        tmp.cleanup()
+
+    return _report(results, duration, bridge_metrics, fake.stats(), initialize_ms, {
+        "requests": requests,
+        "concurrency": concurrency,
+        "agents": agents,
+        "mix": mix,
+        "mode": mode,
+        "latency": latency,
+        "token_rate": token_rate,
+        "reply_tokens": reply_tokens,
+        "failure_rate": failure_rate,
+        "seed": seed
+    })
+
+
+def _summary(latencies: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "req_per_s": round(len(latencies) / duration, 2) if duration else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2)
+    }
+
+
+def _report(results: List[Tuple[str, float, bool]], duration: float, bridge_metrics: Dict[str, Any],
+            fake_stats: Dict[str, Any], initialize_ms: float, settings: Dict[str, Any]) -> Dict[str, Any]:
+    methods = {}
+    for method in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == method]
+        summary = _summary([r[1] for r in rows], sum(1 for r in rows if r[2]), duration)
+        # Bridge-side spans: time not spent in the Letta call or waiting
+        # for a turn (agent queue, concurrency slots) is bridge overhead
+        stages = bridge_metrics.get("methods", {}).get(method, {})
+        total = stages.get("total", {}).get("mean_ms", 0.0)
+        letta = stages.get("letta", {}).get("mean_ms", 0.0)
+        queue = stages.get("queue", {}).get("mean_ms", 0.0)
+        summary["bridge_total_mean_ms"] = total
+        summary["letta_mean_ms"] = letta
+        summary["queue_mean_ms"] = queue
+        summary["overhead_mean_ms"] = round(total - letta - queue, 3)
+        methods[method] = summary
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "settings": settings,
+        "initialize_ms": round(initialize_ms, 2),
+        "duration_s": round(duration, 3),
+        "overall": _summary([r[1] for r in results], sum(1 for r in results if r[2]), duration),
+        "methods": methods,
+        "fake_letta": fake_stats
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Per-method change against a saved report"""
+    lines = [f"Compared with {baseline.get('revision') or 'baseline'} ({baseline.get('timestamp', '?')})"]
+    for method, current in report["methods"].items():
+        previous = baseline.get("methods", {}).get(method)
+        if previous is None:
+            continue
+        deltas = []
+        for key in ("req_per_s", "p50_ms", "p99_ms", "overhead_mean_ms"):
+            before, after = previous.get(key), current.get(key)
+            if before:
+                deltas.append(f"{key} {before} -> {after} ({(after - before) / before * 100:+.1f}%)")
+        lines.append(f"  {method}: " + ", ".join(deltas))
+    return lines
+
+
+def _print_report(report: Dict[str, Any]):
+    overall = report["overall"]
+    print(f"initialize reply: {report['initialize_ms']} ms")
+    print(f"{overall['requests']} requests in {report['duration_s']} s: {overall['req_per_s']} req/s, "
+          f"p50 {overall['p50_ms']} ms, p99 {overall['p99_ms']} ms, {overall['errors']} errors")
+    print(f"{'method':<16}{'req/s':>8}{'p50 ms':>10}{'p99 ms':>10}{'letta ms':>10}{'queue ms':>10}"
+          f"{'overhead ms':>13}{'errors':>8}")
+    for method, m in report["methods"].items():
+        print(f"{method:<16}{m['req_per_s']:>8}{m['p50_ms']:>10}{m['p99_ms']:>10}{m['letta_mean_ms']:>10}"
+              f"{m['queue_mean_ms']:>10}{m['overhead_mean_ms']:>13}{m['errors']:>8}")
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        method = name if "/" in name else f"agent/{name}"
+        mix[method] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ACP-Letta bridge against a fake Letta server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="method weights, e.g. complete=6,edit=2,message=2")
+    parser.add_argument("--mode", choices=("stdio", "daemon"), default="stdio")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Letta seconds per call")
+    parser.add_argument("--token-rate", type=float, default=400.0, help="fake Letta tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the JSON report")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        agents=args.agents,
+        mix=args.mix,
+        mode=args.mode,
+        latency=args.latency,
+        token_rate=args.token_rate,
+        reply_tokens=args.reply_tokens,
+        failure_rate=args.failure_rate,
+        seed=args.seed
+    ))
+    _print_report(report)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved report to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(report, json.load(f))))
+
+
+if __name__ == "__main__":
+    main()
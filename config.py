@@ -5,7 +5,7 @@ Load from environment variables and .env file
 
 import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 
 
 class BridgeConfig(BaseSettings):
@@ -25,6 +25,71 @@ class BridgeConfig(BaseSettings):
     log_level: str = "INFO"
     max_agents: int = 10
     agent_timeout: int = 300  # seconds
+    max_requests_per_agent: int = 1  # concurrent Letta calls per agent; 1 keeps order
+    max_concurrent_requests: int = 8  # requests running at once
+    max_pending_requests: int = 64  # running + queued before reads pause
+    method_concurrency: Dict[str, int] = {  # per-method caps, JSON in env
+        "agent/edit": 2,
+        "agent/create": 1,
+        "agent/delete": 1
+    }
+    letta_max_workers: int = 8  # threads running blocking Letta SDK calls
+    enable_streaming: bool = False  # forward completion/edit chunks as notifications
+    json_codec: str = "auto"  # auto, orjson, msgspec or json
+    startup_retry_initial: float = 0.5  # seconds before the first reconnect attempt
+    startup_retry_max: float = 30.0  # backoff cap between attempts
+    startup_wait_timeout: float = 30.0  # how long agent requests wait for Letta at startup
+    keep_raw_responses: bool = False  # debug: attach SDK response objects to results
+    
+    # Request Batching (opt-in)
+    enable_batching: bool = False
+    batch_window_ms: int = 20  # how long a batch collects messages
+    max_batch_size: int = 8
+    
+    # Daemon Mode (--serve / --connect)
+    daemon_socket: str = "~/.cache/lettabridge/bridge.sock"
+    daemon_port: int = 0  # localhost TCP port instead of the Unix socket
+    
+    # HTTP Transport
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 60.0  # seconds an idle connection is kept
+    http_connect_timeout: float = 5.0  # seconds
+    http_read_timeout: float = 300.0  # seconds, long agent steps
+    http2: bool = False  # requires the h2 package
+    warm_up_connection: bool = True  # open a pooled connection on connect
+    
+    # Agent Resolution
+    agent_cache_path: str = "~/.cache/lettabridge/agents.json"  # empty disables
+    validate_agent_cache: bool = True  # confirm cached ids with one GET
+    
+    # Prompt Budget
+    prompt_max_bytes: int = 16000  # completion/edit prompt size, ~4 bytes per token; 0 disables
+    prompt_window_lines: int = 60  # lines kept around the cursor or edit region
+    context_drop_keys: List[str] = [  # context keys dropped first when over budget
+        "diagnostics",
+        "history",
+        "openFiles",
+        "outline",
+        "symbols"
+    ]
+    
+    # Completion Cache
+    enable_response_cache: bool = True
+    response_cache_size: int = 256  # entries
+    response_cache_ttl: int = 300  # seconds
+    
+    # Metrics Export (bridge/metrics is always available)
+    metrics_file: str = ""  # Prometheus text file rewritten every metrics_interval
+    metrics_port: int = 0  # >0 serves Prometheus text on 127.0.0.1
+    metrics_interval: float = 10.0  # seconds
+    
+    # Agent Memory
+    memory_cache_ttl: float = 300.0  # seconds memory blocks are reused; 0 always refetches
+    memory_notifications: bool = True  # push agent/memoryChanged to sessions that read that memory
+    
+    # Session Capture (stdio sessions; replay with replay.py)
+    record_path: str = ""  # JSONL log of frames and Letta calls; empty disables
     
     # Tool Configuration
     enable_web_search: bool = True
@@ -34,7 +99,3 @@ class BridgeConfig(BaseSettings):
     class Config:
         env_file = ".env"
         env_prefix = "BRIDGE_"
-
-
-# Singleton instance
-config = BridgeConfig()
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Bridge daemon
+Serve many ACP sessions from one process over a Unix socket or localhost TCP
+"""
+
+import os
+import socket
+import asyncio
+import logging
+from typing import Optional, Set
+
+from config import BridgeConfig
+from letta_wrapper import LettaClientWrapper
+from response_cache import ResponseCache
+from agent_pool import AgentPool
+from metrics import BridgeMetrics, MetricsExporter
+from transport import StdioTransport, READ_LIMIT
+from acp_letta_bridge import ACPLettaBridge
+
+logger = logging.getLogger(__name__)
+
+
+class BridgeDaemon:
+    """
+    Long-lived bridge process shared by editor windows
+
+    Each connection gets its own ACPLettaBridge session (transport,
+    in-flight requests, cancellation), while the Letta client pool,
+    agent pool, response cache and metrics are shared by every session.
+    """
+
+    def __init__(self, config: BridgeConfig):
+        self.config = config
+        self.letta_client = LettaClientWrapper(config)
+        self.agent_pool = AgentPool(config, self.letta_client)
+        self.response_cache: Optional[ResponseCache] = None
+        if config.enable_response_cache:
+            self.response_cache = ResponseCache(
+                max_size=config.response_cache_size,
+                ttl=config.response_cache_ttl
+            )
+        self.metrics = BridgeMetrics()
+        self.exporter = MetricsExporter(
+            self.metrics, config.metrics_file, config.metrics_port, config.metrics_interval
+        )
+        self.agent_id: Optional[str] = None
+        self.sessions: Set[ACPLettaBridge] = set()
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def new_session(self) -> ACPLettaBridge:
+        """Bridge session bound to the shared client, agent and cache"""
+        session = ACPLettaBridge(
+            self.config,
+            letta_client=self.letta_client,
+            response_cache=self.response_cache,
+            agent_pool=self.agent_pool,
+            metrics=self.metrics
+        )
+        session.agent_id = self.agent_id
+        return session
+
+    async def start(self):
+        """Connect to Letta once (retrying until reachable), then start listening"""
+        bootstrap = self.new_session()
+        await bootstrap.initialize_with_retry()
+        self.agent_id = bootstrap.agent_id
+        await self.exporter.start()
+
+        if self.config.daemon_port:
+            self.server = await asyncio.start_server(
+                self._handle_connection, "127.0.0.1", self.config.daemon_port
+            )
+            logger.info(f"Bridge daemon listening on 127.0.0.1:{self.config.daemon_port}")
+        else:
+            path = os.path.expanduser(self.config.daemon_socket)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            _remove_stale_socket(path)
+            self.server = await asyncio.start_unix_server(self._handle_connection, path=path)
+            logger.info(f"Bridge daemon listening on {path}")
+
+    async def stop(self):
+        """Stop accepting sessions and release shared resources"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if not self.config.daemon_port:
+            path = os.path.expanduser(self.config.daemon_socket)
+            if os.path.exists(path):
+                os.unlink(path)
+        await self.exporter.stop()
+        await self.letta_client.disconnect()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Run one editor session until it disconnects or shuts down"""
+        session = self.new_session()
+        self.sessions.add(session)
+        logger.info(f"Session opened ({len(self.sessions)} active)")
+        try:
+            await session.serve(StdioTransport(reader, writer))
+        except Exception as e:
+            logger.error(f"Session failed: {e}", exc_info=True)
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+            logger.info(f"Session closed ({len(self.sessions)} active)")
+
+
+def _remove_stale_socket(path: str):
+    """Unlink a socket file left by a dead daemon; refuse if one is live"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise RuntimeError(f"A bridge daemon is already listening on {path}")
+    finally:
+        probe.close()
+
+
+async def open_daemon_connection(config: BridgeConfig):
+    """Open a stream pair to the configured daemon"""
+    if config.daemon_port:
+        return await asyncio.open_connection("127.0.0.1", config.daemon_port)
+    return await asyncio.open_unix_connection(os.path.expanduser(config.daemon_socket))
+
+
+async def serve_daemon(config: BridgeConfig):
+    """Entry point for --serve"""
+    daemon = BridgeDaemon(config)
+    await daemon.start()
+    try:
+        await daemon.server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await daemon.stop()
+
+
+async def _pump(source: asyncio.StreamReader, sink, half_close: bool = False):
+    """Copy bytes until the source reaches EOF"""
+    while True:
+        data = await source.read(READ_LIMIT)
+        if not data:
+            break
+        sink.write(data)
+        await sink.drain()
+    if half_close and sink.can_write_eof():
+        sink.write_eof()
+
+
+async def run_shim(config: BridgeConfig) -> bool:
+    """
+    Entry point for --connect: forward stdio frames to the daemon
+
+    Frames use the same Content-Length encoding on both sides, so bytes
+    are relayed without decoding. Returns False without touching stdio
+    when no daemon is reachable, so the caller can run in-process.
+    """
+    try:
+        reader, writer = await open_daemon_connection(config)
+    except OSError as e:
+        logger.info(f"No bridge daemon reachable ({e}), running in-process")
+        return False
+
+    stdio = await StdioTransport.open_stdio()
+    upstream = asyncio.create_task(_pump(stdio.reader, writer, half_close=True))
+    try:
+        # The session ends when the daemon closes its side
+        await _pump(reader, stdio.writer)
+    finally:
+        upstream.cancel()
+        writer.close()
+    return True
@@ -0,0 +1,190 @@
+"""
+Method Dispatcher
+Registry-based JSON-RPC routing with per-method limits and priorities
+"""
+
+import time
+import heapq
+import asyncio
+import inspect
+import logging
+import itertools
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Type
+
+from pydantic import BaseModel, ValidationError
+
+from acp_protocol import ACPHandler, METHOD_NOT_FOUND, INVALID_REQUEST, INVALID_PARAMS
+from protocol import METHOD_PRIORITIES, DEFAULT_PRIORITY, CONTROL_PRIORITY
+from agent_pool import current_turn
+from metrics import current_span
+
+logger = logging.getLogger(__name__)
+
+
+class PrioritySemaphore:
+    """Semaphore that hands freed slots to the lowest priority value first"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int = DEFAULT_PRIORITY):
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before cancellation
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+
+class Route:
+    """Resolved handler plus its scheduling policy"""
+
+    __slots__ = ("method", "handler", "priority", "limit", "wants_request_id", "params_model")
+
+    def __init__(self, method: str, handler: Callable[..., Awaitable[Dict[str, Any]]],
+                 priority: int, limit: Optional[asyncio.Semaphore]):
+        self.method = method
+        self.handler = handler
+        self.priority = priority
+        self.limit = limit
+        parameters = inspect.signature(handler).parameters
+        # Streaming handlers need the JSON-RPC id to tag notifications
+        self.wants_request_id = "request_id" in parameters
+        # Handlers annotated with a params model get a validated instance
+        self.params_model = _params_model(parameters)
+
+
+def _params_model(parameters) -> Optional[Type[BaseModel]]:
+    annotation = parameters["params"].annotation if "params" in parameters else None
+    if inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+        return annotation
+    return None
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'params'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+class MethodDispatcher:
+    """
+    JSON-RPC dispatcher built once from method -> handler tables
+
+    Control methods (priority 0) bypass the shared concurrency cap so
+    cancel and shutdown never queue behind completions. Other methods
+    wait for their agent's turn if one was reserved, then take their
+    per-method slot, then a shared slot in priority order.
+    """
+
+    def __init__(self, max_concurrent: int, method_limits: Optional[Dict[str, int]] = None):
+        self.acp_handler = ACPHandler()
+        self.method_limits = method_limits or {}
+        self._slots = PrioritySemaphore(max_concurrent)
+        self._routes: Dict[str, Route] = {}
+
+    def register(self, method: str, handler: Callable[..., Awaitable[Dict[str, Any]]]):
+        """Register a handler; a later registration for the same method wins"""
+        limit = self.method_limits.get(method)
+        self._routes[method] = Route(
+            method,
+            handler,
+            METHOD_PRIORITIES.get(method, DEFAULT_PRIORITY),
+            asyncio.Semaphore(limit) if limit else None
+        )
+
+    def register_table(self, target: Any, table: Dict[str, str]):
+        """Register every method in a method -> attribute name table"""
+        for method, attribute in table.items():
+            self.register(method, getattr(target, attribute))
+
+    @property
+    def methods(self) -> List[str]:
+        return sorted(self._routes)
+
+    async def call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the request's handler and build its JSON-RPC response"""
+        method = request.get("method")
+        params = request.get("params") or {}
+        request_id = request.get("id")
+
+        if not isinstance(method, str):
+            return self.acp_handler.error_response(request_id, "Invalid Request", code=INVALID_REQUEST)
+
+        route = self._routes.get(method)
+        if route is None:
+            logger.warning(f"Unknown method: {method}")
+            return self.acp_handler.error_response(
+                request_id, f"Method not found: {method}", code=METHOD_NOT_FOUND
+            )
+
+        logger.debug(f"Received request: {method}")
+
+        if route.params_model is not None:
+            try:
+                params = route.params_model.model_validate(params)
+            except ValidationError as e:
+                return self.acp_handler.error_response(
+                    request_id, f"Invalid params: {_describe(e)}", code=INVALID_PARAMS
+                )
+
+        try:
+            result = await self._run(route, params, request_id)
+            return self.acp_handler.success_response(request_id, result)
+        except Exception as e:
+            logger.error(f"Error handling {method}: {e}", exc_info=True)
+            return self.acp_handler.error_response(request_id, str(e))
+
+    async def _run(self, route: Route, params: Any, request_id: Any) -> Dict[str, Any]:
+        if route.priority == CONTROL_PRIORITY:
+            return await self._invoke(route, params, request_id)
+
+        # A request queued behind its agent's earlier requests holds no
+        # slot meanwhile, so one busy agent cannot starve the others
+        turn = current_turn.get()
+        if turn is not None:
+            await turn.ready()
+
+        # Take the per-method slot first so a request waiting on its own
+        # method limit never holds a shared slot
+        if route.limit is None:
+            return await self._run_shared(route, params, request_id)
+        async with route.limit:
+            return await self._run_shared(route, params, request_id)
+
+    async def _run_shared(self, route: Route, params: Any, request_id: Any) -> Dict[str, Any]:
+        await self._slots.acquire(route.priority)
+        try:
+            return await self._invoke(route, params, request_id)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    async def _invoke(route: Route, params: Any, request_id: Any) -> Dict[str, Any]:
+        span = current_span.get()
+        if span is not None:
+            span.add("queue", time.perf_counter() - span.queued_at)
+        if route.wants_request_id:
+            return await route.handler(params, request_id=request_id)
+        return await route.handler(params)
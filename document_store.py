@@ -0,0 +1,150 @@
+"""
+Document Store
+Per-session copies of open documents, kept current with incremental changes
+"""
+
+import difflib
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Earlier versions kept per document, so an edit queued behind a
+# newer change can still be diffed against the version it referenced
+MAX_VERSIONS = 4
+
+
+class Document:
+    """One open document and its most recent versions"""
+
+    __slots__ = ("uri", "versions")
+
+    def __init__(self, uri: str, text: str, version: int):
+        self.uri = uri
+        self.versions: Deque[Tuple[int, str]] = deque([(version, text)], maxlen=MAX_VERSIONS)
+
+    @property
+    def version(self) -> int:
+        return self.versions[-1][0]
+
+    @property
+    def text(self) -> str:
+        return self.versions[-1][1]
+
+    def at(self, version: Optional[int]) -> str:
+        """Text at a version; None means the latest"""
+        if version is None:
+            return self.text
+        for known, text in self.versions:
+            if known == version:
+                return text
+        raise ValueError(
+            f"Unknown version {version} of {self.uri} (latest is {self.version})"
+        )
+
+
+def _offset(text: str, position: Dict[str, int]) -> int:
+    """Offset of an LSP-style {line, character} position; characters are code points"""
+    line = position.get("line", 0)
+    offset = 0
+    for _ in range(line):
+        newline = text.find("\n", offset)
+        if newline < 0:
+            return len(text)
+        offset = newline + 1
+    end_of_line = text.find("\n", offset)
+    if end_of_line < 0:
+        end_of_line = len(text)
+    return min(offset + position.get("character", 0), end_of_line)
+
+
+def apply_change(text: str, change: Dict[str, Any]) -> str:
+    """Apply one content change; a change without a range replaces the text"""
+    span = change.get("range")
+    if span is None:
+        return change.get("text", "")
+    start = _offset(text, span["start"])
+    end = _offset(text, span["end"])
+    return text[:start] + change.get("text", "") + text[end:]
+
+
+def split_lines(text: str) -> List[str]:
+    """Lines of text with their endings, split only at newlines as _offset does (not str.splitlines)"""
+    parts = text.split("\n")
+    lines = [part + "\n" for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def line_edits(old: str, new: str, first_line: int = 0, at_end: bool = True) -> List[Dict[str, Any]]:
+    """
+    Minimal line-level text edits turning old into new
+
+    old starts at first_line of its document; at_end says whether it runs
+    to the end of the document. Edit ranges use {line, character}
+    positions against the original document.
+    """
+    old_lines = split_lines(old)
+    new_lines = split_lines(new)
+
+    def position(index: int) -> Dict[str, int]:
+        # Past the last line of a document without a final newline, point
+        # at the end of that line instead
+        if index >= len(old_lines) and at_end and old_lines and not old_lines[-1].endswith("\n"):
+            return {"line": first_line + len(old_lines) - 1, "character": len(old_lines[-1])}
+        return {"line": first_line + index, "character": 0}
+
+    edits = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        edits.append({
+            "range": {"start": position(i1), "end": position(i2)},
+            "newText": "".join(new_lines[j1:j2])
+        })
+    return edits
+
+
+class DocumentStore:
+    """
+    Documents a client has opened in this session
+
+    The client sends the full text once on open, then only changes, so
+    agent/edit requests can refer to a document by uri and version
+    instead of resending the whole file.
+    """
+
+    def __init__(self):
+        self._documents: Dict[str, Document] = {}
+
+    def open(self, uri: str, text: str, version: int = 0) -> Document:
+        document = Document(uri, text, version)
+        self._documents[uri] = document
+        return document
+
+    def change(self, uri: str, version: int, changes: List[Dict[str, Any]]) -> Document:
+        document = self.get(uri)
+        if version <= document.version:
+            raise ValueError(
+                f"Stale change to {uri}: version {version} is not newer than {document.version}"
+            )
+        text = document.text
+        for change in changes:
+            text = apply_change(text, change)
+        document.versions.append((version, text))
+        return document
+
+    def close(self, uri: str) -> bool:
+        return self._documents.pop(uri, None) is not None
+
+    def get(self, uri: str) -> Document:
+        document = self._documents.get(uri)
+        if document is None:
+            raise ValueError(f"Document not open: {uri}")
+        return document
+
+    def __len__(self) -> int:
+        return len(self._documents)
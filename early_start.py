@@ -0,0 +1,126 @@
+"""
+Early initialize
+Answer the editor's initialize before the bridge's heavy imports load
+"""
+
+import os
+import json
+from typing import Dict, Any, Optional
+
+from framing import FrameDecoder, FrameError, encode_frame
+
+# Must match BridgeConfig's env_prefix and env_file
+ENV_PREFIX = "BRIDGE_"
+ENV_FILE = ".env"
+
+# The strings pydantic accepts for a bool field
+TRUE_VALUES = {"1", "on", "t", "true", "y", "yes"}
+FALSE_VALUES = {"0", "off", "f", "false", "n", "no"}
+
+
+def initialize_result(streaming: bool, memory_notifications: bool) -> Dict[str, Any]:
+    """Result of the initialize method; also used by the bridge's own handler"""
+    return {
+        "protocolVersion": "0.1.0",
+        "capabilities": {
+            "completion": True,
+            "edit": True,
+            "memory": True,
+            "memoryNotifications": memory_notifications,
+            "streaming": streaming,
+            "documentSync": "incremental"
+        },
+        "serverInfo": {
+            "name": "Letta Agent",
+            "version": "1.0.0"
+        }
+    }
+
+
+def _env_file(path: str = ENV_FILE) -> Dict[str, str]:
+    """KEY=VALUE lines of a .env file, keys upper-cased"""
+    values = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return values
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):]
+        key, value = line.split("=", 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        values[key.strip().upper()] = value
+    return values
+
+
+def bool_setting(field: str, default: bool, env_file: Optional[Dict[str, str]] = None) -> bool:
+    """
+    A bool BridgeConfig field read without pydantic
+
+    The environment wins over .env, as with pydantic-settings. A value
+    pydantic would reject falls back to the default here; BridgeConfig
+    reports it once the bridge loads.
+    """
+    name = f"{ENV_PREFIX}{field}".upper()
+    value = next((v for k, v in os.environ.items() if k.upper() == name), None)
+    if value is None:
+        value = (env_file if env_file is not None else _env_file()).get(name)
+    if value is None:
+        return default
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return default
+
+
+def _write_all(fd: int, data: bytes):
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def answer_initialize(stdin_fd: int = 0, stdout_fd: int = 1) -> bytes:
+    """
+    Read stdin up to the first frame and answer it if it is initialize
+
+    Returns the bytes read that the bridge still has to serve: everything
+    after the answered frame, or everything read if the first frame was
+    not an initialize request (or stdin ended first).
+    """
+    decoder = FrameDecoder()
+    received = bytearray()
+    while True:
+        try:
+            body = decoder.next_frame()
+        except FrameError:
+            return bytes(received)
+        if body is not None:
+            break
+        chunk = os.read(stdin_fd, 65536)
+        if not chunk:
+            return bytes(received)
+        received += chunk
+        decoder.feed(chunk)
+
+    try:
+        request = json.loads(body)
+    except ValueError:
+        return bytes(received)
+    if not isinstance(request, dict) or request.get("method") != "initialize" or "id" not in request:
+        return bytes(received)
+
+    env_file = _env_file()
+    result = initialize_result(
+        bool_setting("enable_streaming", False, env_file),
+        bool_setting("memory_notifications", True, env_file)
+    )
+    reply = {"jsonrpc": "2.0", "id": request["id"], "result": result}
+    _write_all(stdout_fd, encode_frame(json.dumps(reply).encode("utf-8")))
+    return bytes(received[len(received) - decoder.buffered:])
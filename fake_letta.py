@@ -0,0 +1,287 @@
+"""
+Fake Letta server
+Local stand-in for the Letta REST API with configurable latency and failures
+"""
+
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+
+class FakeLettaServer:
+    """
+    Serves the endpoints the bridge uses: health, agent list/create/
+    retrieve/delete, messages create/stream/cancel
+
+    Each message call takes latency seconds plus reply_tokens/token_rate,
+    and fails with HTTP 500 at failure_rate. Replies are built from the
+    user message so runs are repeatable.
+    """
+
+    def __init__(self, latency: float = 0.05, token_rate: float = 200.0, reply_tokens: int = 40,
+                 failure_rate: float = 0.0, port: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.agents: Dict[str, Dict[str, Any]] = {}  # agent_id -> agent state
+        self.requests = 0
+        self.failures = 0
+        self.service_time = 0.0  # seconds spent "generating" replies
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Serve on a background thread; returns the base URL"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-letta", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "service_seconds": round(self.service_time, 3),
+            "agents": len(self.agents)
+        }
+
+    # Request handling (called from server threads)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = self.failure_rate > 0 and self.random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+            return fail
+
+    def create_agent(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        agent_id = f"agent-{uuid.uuid4()}"
+        agent = {
+            "id": agent_id,
+            "name": body.get("name") or agent_id,
+            "agent_type": "memgpt_v2_agent",
+            "system": body.get("system", ""),
+            "created_at": _now()
+        }
+        with self._lock:
+            self.agents[agent_id] = agent
+        return agent
+
+    def list_agents(self, query: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            agents = list(self.agents.values())
+        if "name" in query:
+            agents = [a for a in agents if a["name"] == query["name"][0]]
+        if "after" in query:
+            ids = [a["id"] for a in agents]
+            after = query["after"][0]
+            agents = agents[ids.index(after) + 1:] if after in ids else []
+        if "limit" in query:
+            agents = agents[:int(query["limit"][0])]
+        return agents
+
+    def reply_tokens_for(self, message: str) -> List[str]:
+        words = message.split() or ["ok"]
+        return [f"{words[i % len(words)]} " for i in range(self.reply_tokens)]
+
+    def message_response(self, agent_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = _user_text(body)
+        tokens = self.reply_tokens_for(prompt)
+        delay = self.latency + len(tokens) / self.token_rate
+        time.sleep(delay)
+        with self._lock:
+            self.service_time += delay
+        run_id = f"run-{uuid.uuid4()}"
+        return {
+            "messages": [{
+                "id": f"message-{uuid.uuid4()}",
+                "message_type": "assistant_message",
+                "content": "".join(tokens).strip(),
+                "date": _now(),
+                "run_id": run_id
+            }],
+            "usage": _usage(prompt, tokens, run_id),
+            "stop_reason": {"message_type": "stop_reason", "stop_reason": "end_turn"}
+        }
+
+    def stream_events(self, agent_id: str, body: Dict[str, Any]):
+        """SSE payloads for a token-streamed reply"""
+        prompt = _user_text(body)
+        tokens = self.reply_tokens_for(prompt)
+        run_id = f"run-{uuid.uuid4()}"
+        message_id = f"message-{uuid.uuid4()}"
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(1 / self.token_rate)
+            yield {
+                "id": message_id,
+                "message_type": "assistant_message",
+                "content": token,
+                "date": _now(),
+                "run_id": run_id
+            }
+        with self._lock:
+            self.service_time += self.latency + len(tokens) / self.token_rate
+        yield {"message_type": "stop_reason", "stop_reason": "end_turn"}
+        yield _usage(prompt, tokens, run_id)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _user_text(body: Dict[str, Any]) -> str:
+    parts = []
+    for message in body.get("messages") or []:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+
+def _usage(prompt: str, tokens: List[str], run_id: str) -> Dict[str, Any]:
+    prompt_tokens = max(1, len(prompt) // 4)
+    return {
+        "message_type": "usage_statistics",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(tokens),
+        "total_tokens": prompt_tokens + len(tokens),
+        "step_count": 1,
+        "run_ids": [run_id]
+    }
+
+
+def _make_handler(server: FakeLettaServer):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real server, so the bridge's pool is exercised
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _body(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length)) if length else {}
+
+        def _send(self, status: int, payload: Any):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            url = urlparse(self.path)
+            return [p for p in url.path.split("/") if p], parse_qs(url.query)
+
+        def do_GET(self):
+            parts, query = self._route()
+            if parts == ["v1", "health"]:
+                self._send(200, {"version": "fake", "status": "ok"})
+            elif parts == ["v1", "agents"]:
+                self._send(200, server.list_agents(query))
+            elif len(parts) == 3 and parts[:2] == ["v1", "agents"]:
+                agent = server.agents.get(parts[2])
+                if agent is None:
+                    self._send(404, {"detail": f"Agent {parts[2]} not found"})
+                else:
+                    self._send(200, agent)
+            else:
+                self._send(404, {"detail": "Not found"})
+
+        def do_DELETE(self):
+            parts, _ = self._route()
+            if len(parts) == 3 and parts[:2] == ["v1", "agents"] and server.agents.pop(parts[2], None):
+                self._send(200, {})
+            else:
+                self._send(404, {"detail": "Not found"})
+
+        def do_POST(self):
+            parts, _ = self._route()
+            body = self._body()
+            if parts == ["v1", "agents"]:
+                self._send(200, server.create_agent(body))
+                return
+            if len(parts) < 4 or parts[:2] != ["v1", "agents"] or parts[3] != "messages":
+                self._send(404, {"detail": "Not found"})
+                return
+
+            agent_id, action = parts[2], parts[4] if len(parts) > 4 else None
+            if agent_id not in server.agents:
+                self._send(404, {"detail": f"Agent {agent_id} not found"})
+            elif action == "cancel":
+                self._send(200, {})
+            elif server.should_fail():
+                self._send(500, {"detail": "Injected failure"})
+            elif action == "stream":
+                self._stream(server.stream_events(agent_id, body))
+            else:
+                self._send(200, server.message_response(agent_id, body))
+
+        def _stream(self, events):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for event in events:
+                    self._chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                # The bridge closed the stream (cancelled request)
+                self.close_connection = True
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Letta server for benchmarks")
+    parser.add_argument("--port", type=int, default=8283)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per message call")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="reply tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of calls answered 500")
+    args = parser.parse_args()
+
+    server = FakeLettaServer(args.latency, args.token_rate, args.reply_tokens, args.failure_rate, args.port)
+    print(f"Fake Letta server on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Content-Length framing codec
+Encode and decode JSON-RPC frames as bytes
+"""
+
+from typing import Optional, Union
+
+CONTENT_LENGTH = b"content-length"
+
+# Compact the decode buffer once this many consumed bytes sit in front of it
+COMPACT_THRESHOLD = 2 ** 16
+
+
+class FrameError(ValueError):
+    """A frame header that cannot be decoded; the decoder skips to the next frame"""
+
+
+def encode_frame(body: bytes) -> bytes:
+    """Build header and body as a single buffer for one write"""
+    return b"".join((b"Content-Length: %d\r\n\r\n" % len(body), body))
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for Content-Length framed messages
+
+    Bytes are appended to one bytearray and frames are located by offset,
+    so partial reads never re-slice or re-decode earlier data. Consumed
+    bytes are dropped in bulk rather than per frame.
+
+    After a bad header, the bytes up to the next Content-Length header
+    (the bad frame's body included) are discarded.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+        self._resync = False
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]):
+        """Append raw bytes read from the stream"""
+        self._buffer += data
+
+    def next_frame(self) -> Optional[bytes]:
+        """
+        Return the next complete message body, or None if incomplete
+
+        Raises FrameError for a missing-number or negative Content-Length;
+        later calls resume at the following frame.
+        """
+        if self._resync and not self._skip_to_header():
+            return None
+        buffer = self._buffer
+        position = self._offset
+        content_length: Optional[int] = None
+
+        # Walk header lines up to the blank separator line
+        while True:
+            end = buffer.find(b"\n", position)
+            if end == -1:
+                return None
+            line_end = end - 1 if end > position and buffer[end - 1] == 0x0D else end
+            if line_end == position:
+                position = end + 1
+                if content_length is not None:
+                    break
+                # Stray blank line between frames
+                self._offset = position
+                continue
+            colon = buffer.find(b":", position, line_end)
+            if colon != -1 and bytes(buffer[position:colon]).strip().lower() == CONTENT_LENGTH:
+                try:
+                    content_length = int(buffer[colon + 1:line_end])
+                except ValueError:
+                    content_length = -1
+                if content_length < 0:
+                    value = bytes(buffer[colon + 1:line_end]).strip()
+                    self._offset = end + 1
+                    self._resync = True
+                    raise FrameError(f"Invalid Content-Length header: {value!r}")
+            position = end + 1
+
+        body_end = position + content_length
+        if len(buffer) < body_end:
+            return None
+
+        body = bytes(memoryview(buffer)[position:body_end])
+        self._offset = body_end
+        self._compact()
+        return body
+
+    def _skip_to_header(self) -> bool:
+        """Drop bytes up to the next Content-Length header; False if none is buffered yet"""
+        start = bytes(self._buffer[self._offset:]).lower().find(CONTENT_LENGTH)
+        if start == -1:
+            # Keep a tail that may hold the start of a split header name
+            self._offset = max(self._offset, len(self._buffer) - len(CONTENT_LENGTH))
+            self._compact()
+            return False
+        self._offset += start
+        self._resync = False
+        return True
+
+    def _compact(self):
+        """Drop consumed bytes from the front of the buffer"""
+        if self._offset == len(self._buffer):
+            self._buffer.clear()
+            self._offset = 0
+        elif self._offset >= COMPACT_THRESHOLD:
+            del self._buffer[:self._offset]
+            self._offset = 0
+
+    @property
+    def buffered(self) -> int:
+        """Number of unconsumed bytes held by the decoder"""
+        return len(self._buffer) - self._offset
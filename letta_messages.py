@@ -0,0 +1,177 @@
+"""
+Letta response extraction
+Single-pass classification of Letta messages into compact typed results
+"""
+
+from typing import Dict, Any, Optional, List
+
+# Letta's built-in tools that edit the agent's core memory blocks
+MEMORY_TOOLS = frozenset({
+    "core_memory_append",
+    "core_memory_replace",
+    "memory",
+    "memory_insert",
+    "memory_replace",
+    "memory_rethink",
+    "rethink_memory",
+})
+
+
+def _content_text(content: Any) -> str:
+    """Flatten assistant message content (str or list of content parts)"""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(part, "text", "") or "" for part in content or [])
+
+
+class Usage:
+    """Token usage reported by Letta for one request, plus its wall time"""
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens", "step_count", "seconds")
+
+    def __init__(self, prompt_tokens: int = 0, completion_tokens: int = 0,
+                 total_tokens: int = 0, step_count: int = 0, seconds: float = 0.0):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+        self.step_count = step_count
+        self.seconds = seconds  # Letta call duration as seen by the bridge
+
+    @classmethod
+    def from_sdk(cls, usage: Any) -> "Usage":
+        """Copy the counters off an SDK usage object; unreported ones are 0"""
+        return cls(
+            getattr(usage, "prompt_tokens", None) or 0,
+            getattr(usage, "completion_tokens", None) or 0,
+            getattr(usage, "total_tokens", None) or 0,
+            getattr(usage, "step_count", None) or 0
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class AgentResponse:
+    """
+    What the bridge keeps of one Letta reply
+
+    raw holds the SDK response only when keep_raw_responses is set, so
+    results held by caches or pending futures do not pin whole responses.
+    """
+
+    __slots__ = ("text", "reasoning", "memory_updated", "tool_calls", "usage", "batched", "raw")
+
+    def __init__(self, text: str = "", reasoning: str = "", memory_updated: bool = False,
+                 tool_calls: Optional[List[str]] = None, usage: Optional[Usage] = None,
+                 batched: int = 0, raw: Any = None):
+        self.text = text
+        self.reasoning = reasoning
+        self.memory_updated = memory_updated
+        self.tool_calls = tool_calls or []
+        self.usage = usage
+        self.batched = batched  # size of the batch this reply was split from; 0 if unbatched
+        self.raw = raw
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe view (raw is left out)"""
+        return {
+            "text": self.text,
+            "reasoning": self.reasoning,
+            "memory_updated": self.memory_updated,
+            "tool_calls": list(self.tool_calls),
+            "usage": self.usage.to_dict() if self.usage is not None else None,
+            "batched": self.batched
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentResponse":
+        usage = data.get("usage")
+        return cls(
+            data.get("text", ""),
+            data.get("reasoning", ""),
+            data.get("memory_updated", False),
+            data.get("tool_calls"),
+            Usage(**usage) if usage else None,
+            data.get("batched", 0)
+        )
+
+
+class ResponseBuilder:
+    """
+    Folds Letta messages or stream chunks into an AgentResponse, one pass
+
+    Streams deliver text and reasoning as token deltas, so parts are
+    joined with "" there and with a newline for whole messages.
+    """
+
+    __slots__ = ("separator", "text_parts", "reasoning_parts", "tool_calls",
+                 "memory_calls", "memory_updated", "usage")
+
+    def __init__(self, separator: str = "\n"):
+        self.separator = separator
+        self.text_parts: List[str] = []
+        self.reasoning_parts: List[str] = []
+        self.tool_calls: List[str] = []
+        self.memory_calls: set = set()  # tool_call_ids of memory edits awaiting their return
+        self.memory_updated = False
+        self.usage: Optional[Usage] = None
+
+    def add(self, message: Any) -> str:
+        """Classify one message; returns its assistant text ("" for other types)"""
+        message_type = getattr(message, "message_type", None)
+        if message_type == "assistant_message":
+            text = _content_text(message.content)
+            if text:
+                self.text_parts.append(text)
+            return text
+        if message_type == "reasoning_message":
+            if message.reasoning:
+                self.reasoning_parts.append(message.reasoning)
+        elif message_type == "tool_call_message":
+            for call in getattr(message, "tool_calls", None) or [message.tool_call]:
+                self._tool_call(call)
+        elif message_type == "tool_return_message":
+            # A failed memory edit changed nothing
+            if message.status == "error" and message.tool_call_id in self.memory_calls:
+                self.memory_calls.discard(message.tool_call_id)
+                self.memory_updated = bool(self.memory_calls)
+        elif message_type == "usage_statistics":
+            self.usage = Usage.from_sdk(message)
+        return ""
+
+    def _tool_call(self, call: Any):
+        if call is None:
+            return
+        name = call.name
+        # Streamed tool calls repeat as deltas; only the first carries the name
+        if name:
+            self.tool_calls.append(name)
+        if name in MEMORY_TOOLS:
+            self.memory_calls.add(call.tool_call_id)
+            self.memory_updated = True
+
+    def build(self, raw: Any = None, seconds: Optional[float] = None) -> AgentResponse:
+        """The response; seconds (the call's duration) also fills in unreported usage"""
+        usage = self.usage
+        if seconds is not None:
+            usage = usage or Usage()
+            usage.seconds = round(seconds, 6)
+        return AgentResponse(
+            self.separator.join(self.text_parts),
+            self.separator.join(self.reasoning_parts),
+            self.memory_updated,
+            self.tool_calls,
+            usage,
+            raw=raw
+        )
+
+
+def extract_response(response: Any, keep_raw: bool = False, seconds: Optional[float] = None) -> AgentResponse:
+    """AgentResponse for a LettaResponse from agents.messages.create"""
+    builder = ResponseBuilder()
+    for message in response.messages:
+        builder.add(message)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        builder.usage = Usage.from_sdk(usage)
+    return builder.build(response if keep_raw else None, seconds)
@@ -4,54 +4,183 @@ Handles communication with Letta server
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
-from letta_client import Letta  # pip install letta-client
+import functools
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 from config import BridgeConfig
+from agent_cache import AgentIdCache
+from letta_messages import AgentResponse, ResponseBuilder, extract_response
+from memory_cache import MemoryBlock, MemoryCache
+from metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# The Letta SDK (and httpx) take a few hundred ms to import, so they are
+# loaded on first connect, on a worker thread, instead of at startup
+httpx = None
+Letta = NotFoundError = DefaultHttpxClient = None
+
+
+def _load_sdk():
+    """Import the Letta SDK into this module (pip install letta-client)"""
+    global httpx, Letta, NotFoundError, DefaultHttpxClient
+    import httpx as _httpx
+    import letta_client
+    httpx = httpx or _httpx
+    Letta = Letta or letta_client.Letta
+    NotFoundError = NotFoundError or letta_client.NotFoundError
+    DefaultHttpxClient = DefaultHttpxClient or letta_client.DefaultHttpxClient
+
+# Marks the end of a streamed response on the chunk queue
+_STREAM_END = object()
+
+# SDK calls the current task stopped waiting for (timeout or cancellation)
+# that are still running on a worker; set by the agent pool, which holds
+# the agent's turn until they finish
+abandoned_calls: ContextVar[Optional[List[asyncio.Future]]] = ContextVar("abandoned_calls", default=None)
+
+
+def _abandon(call: asyncio.Future):
+    """Leave a worker call running; whoever holds the agent's turn waits for it"""
+    # Retrieve its outcome so a late failure is not reported as unhandled
+    call.add_done_callback(lambda f: f.cancelled() or f.exception())
+    calls = abandoned_calls.get()
+    if calls is not None:
+        calls.append(call)
+
 
 class LettaClientWrapper:
     """Wrapper around Letta Python SDK"""
     
     def __init__(self, config: BridgeConfig):
         self.config = config
-        self.client: Optional[Letta] = None
+        self.client: Optional["Letta"] = None
+        self.http_client: Optional["httpx.Client"] = None
         self.agents: Dict[str, str] = {}  # name -> agent_id
+        self.agent_cache: Optional[AgentIdCache] = None
+        if config.agent_cache_path:
+            self.agent_cache = AgentIdCache(config.agent_cache_path, config.letta_base_url)
+        self.memory_cache = MemoryCache(config.memory_cache_ttl)
+        # Called with the agent id whenever a reply shows a memory edit
+        self.memory_listeners: List[Callable[[str], None]] = []
+        
+        # The Letta SDK is synchronous; its calls run on a bounded pool so
+        # HTTP round-trips never block the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.letta_max_workers,
+            thread_name_prefix="letta"
+        )
+    
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking SDK call on the worker pool, bounded by agent_timeout"""
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        try:
+            # Shielded: the worker thread cannot be interrupted, so the
+            # future must stay pending until the call really returns
+            with timed("letta"):
+                return await asyncio.wait_for(asyncio.shield(call), timeout=self.config.agent_timeout)
+        except asyncio.CancelledError:
+            _abandon(call)
+            raise
+        except asyncio.TimeoutError:
+            _abandon(call)
+            raise TimeoutError(
+                f"Letta call {getattr(func, '__name__', func)} timed out after {self.config.agent_timeout}s"
+            )
         
+    def _build_http_client(self) -> "httpx.Client":
+        """Pooled HTTP transport tuned from BridgeConfig"""
+        http2 = self.config.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("BRIDGE_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        
+        return DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.config.http_max_connections,
+                max_keepalive_connections=self.config.http_max_keepalive_connections,
+                keepalive_expiry=self.config.http_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                self.config.http_read_timeout,
+                connect=self.config.http_connect_timeout
+            ),
+            http2=http2
+        )
+    
     async def connect(self):
-        """Connect to Letta server"""
+        """Connect to Letta server (no-op if already connected)"""
+        if self.client is not None:
+            return
+        await asyncio.get_running_loop().run_in_executor(self._executor, _load_sdk)
         try:
+            self.http_client = self._build_http_client()
             if self.config.letta_api_token:
                 self.client = Letta(
                     base_url=self.config.letta_base_url,
-                    api_key=self.config.letta_api_token
+                    api_key=self.config.letta_api_token,
+                    http_client=self.http_client
                 )
             else:
-                self.client = Letta(base_url=self.config.letta_base_url)
+                self.client = Letta(
+                    base_url=self.config.letta_base_url,
+                    http_client=self.http_client
+                )
             logger.info(f"Connected to Letta server: {self.config.letta_base_url}")
         except Exception as e:
             logger.error(f"Failed to connect to Letta: {e}")
             raise
+        
+        if self.config.warm_up_connection:
+            await self._warm_up()
+    
+    async def _warm_up(self):
+        """Open a pooled connection now so the first request skips TCP/TLS setup"""
+        try:
+            await self._run(self.client.health)
+            logger.debug("Letta connection warmed up")
+        except Exception as e:
+            logger.warning(f"Letta warm-up request failed: {e}")
     
     async def disconnect(self):
         """Disconnect from Letta server"""
-        # Letta client doesn't require explicit disconnect
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.http_client is not None:
+            self.http_client.close()
         logger.info("Disconnected from Letta server")
     
     async def get_or_create_agent(self, agent_name: str, agent_config: Dict[str, Any]) -> str:
         """Get existing agent or create new one"""
         try:
-            # List existing agents
-            agents_response = self.client.agents.list()
+            # Warm start: trust or validate the id cached on disk
+            cached_id = self.agent_cache.get(agent_name) if self.agent_cache else None
+            if cached_id is not None:
+                if not self.config.validate_agent_cache or await self._run(
+                    self._agent_matches, cached_id, agent_name
+                ):
+                    logger.info(f"Using cached agent: {agent_name} ({cached_id})")
+                    self.agents[agent_name] = cached_id
+                    return cached_id
+                logger.info(f"Cached agent id for {agent_name} is stale")
+                self.agent_cache.discard(agent_name)
+            
+            # Look up existing agent by name on the server
+            existing = await self._run(self._find_agent, agent_name)
             
             # Check if agent exists
-            for agent in agents_response:
-                if hasattr(agent, 'name') and agent.name == agent_name:
-                    logger.info(f"Found existing agent: {agent_name} ({agent.id})") 
-                    self.agents[agent_name] = agent.id
-                    return agent.id
+            if existing is not None:
+                logger.info(f"Found existing agent: {agent_name} ({existing})") 
+                self.agents[agent_name] = existing
+                if self.agent_cache:
+                    self.agent_cache.put(agent_name, existing)
+                return existing
             
             # Create new agent
             logger.info(f"Creating new agent: {agent_name}")
@@ -62,13 +191,17 @@ class LettaClientWrapper:
                 {"label": "human", "value": "The user is a software developer."}
             ]
             
-            agent_state = self.client.agents.create(
+            agent_state = await self._run(
+                self.client.agents.create,
+                name=agent_name,
                 model="openai/gpt-4o-mini",
                 embedding="openai/text-embedding-3-small",
                 memory_blocks=memory_blocks
             )
             
             self.agents[agent_name] = agent_state.id
+            if self.agent_cache:
+                self.agent_cache.put(agent_name, agent_state.id)
             logger.info(f"Created agent: {agent_name} ({agent_state.id})")
             return agent_state.id
             
@@ -76,45 +209,194 @@ class LettaClientWrapper:
             logger.error(f"Error getting/creating agent: {e}")
             raise
     
-    async def send_message(self, agent_id: str, message: str) -> Dict[str, Any]:
+    async def create_agent(self, name: str, instructions: str, tools: Optional[List[str]] = None) -> str:
+        """Create a named agent (agent/create)"""
+        try:
+            memory_blocks = [
+                {"label": "persona", "value": instructions},
+                {"label": "human", "value": "The user is a software developer."}
+            ]
+            
+            kwargs: Dict[str, Any] = {}
+            if tools:
+                kwargs["tools"] = tools
+            
+            agent_state = await self._run(
+                self.client.agents.create,
+                name=name,
+                model="openai/gpt-4o-mini",
+                embedding="openai/text-embedding-3-small",
+                memory_blocks=memory_blocks,
+                **kwargs
+            )
+            
+            self.agents[name] = agent_state.id
+            logger.info(f"Created agent: {name} ({agent_state.id})")
+            return agent_state.id
+            
+        except Exception as e:
+            logger.error(f"Error creating agent: {e}")
+            raise
+    
+    async def delete_agent(self, agent_id: str):
+        """Delete an agent (agent/delete)"""
+        try:
+            await self._run(self.client.agents.delete, agent_id)
+            self.memory_cache.invalidate(agent_id)
+            for name, known_id in list(self.agents.items()):
+                if known_id == agent_id:
+                    del self.agents[name]
+                    if self.agent_cache:
+                        self.agent_cache.discard(name)
+            logger.info(f"Deleted agent: {agent_id}")
+        except Exception as e:
+            logger.error(f"Error deleting agent: {e}")
+            raise
+    
+    def _find_agent(self, agent_name: str) -> Optional[str]:
+        """Find an agent by name with a server-side filter (runs on the worker pool)"""
+        for agent in self.client.agents.list(name=agent_name, limit=10):
+            if hasattr(agent, 'name') and agent.name == agent_name:
+                return agent.id
+        return None
+    
+    def _agent_matches(self, agent_id: str, agent_name: str) -> bool:
+        """Check a cached id still names the expected agent (runs on the worker pool)"""
+        try:
+            agent = self.client.agents.retrieve(agent_id)
+        except NotFoundError:
+            return False
+        return getattr(agent, 'name', None) == agent_name
+    
+    async def send_message(self, agent_id: str, message: str) -> AgentResponse:
         """Send message to Letta agent and get response"""
+        return await self.send_messages(agent_id, [message])
+    
+    async def send_messages(self, agent_id: str, messages: List[str]) -> AgentResponse:
+        """Send several user messages to a Letta agent in one request"""
         try:
-            response = self.client.agents.messages.create(
+            started = time.perf_counter()
+            response = await self._run(
+                self.client.agents.messages.create,
                 agent_id=agent_id,
-                messages=[{"role": "user", "content": message}]
+                messages=[{"role": "user", "content": message} for message in messages]
             )
+            seconds = time.perf_counter() - started
             
-            # Extract text from response messages
-            text_parts = []
-            memory_updated = False
-            reasoning = ""
-            
-            for msg in response.messages:
-                if hasattr(msg, 'text') and msg.text:
-                    text_parts.append(msg.text)
-                if hasattr(msg, 'function_call'):
-                    if msg.function_call and 'memory' in msg.function_call.name:
-                        memory_updated = True
-            
-            return {
-                "text": "\n".join(text_parts),
-                "memory_updated": memory_updated,
-                "reasoning": reasoning,
-                "raw_response": response
-            }
+            with timed("extract"):
+                result = extract_response(response, self.config.keep_raw_responses, seconds)
+            if result.memory_updated:
+                self._memory_edited(agent_id)
+            return result
             
         except Exception as e:
             logger.error(f"Error sending message to agent: {e}")
+            if isinstance(e, TimeoutError):
+                # Stop the run the abandoned call is still waiting on
+                await self.cancel_runs(agent_id)
+            raise
+    
+    async def stream_message(
+        self,
+        agent_id: str,
+        message: str,
+        on_text: Callable[[str], Awaitable[None]]
+    ) -> AgentResponse:
+        """
+        Stream a message to a Letta agent, forwarding text deltas as they arrive
+        
+        on_text is awaited for every assistant text chunk. Returns the same
+        shape as send_message once the stream completes.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        
+        def produce():
+            # Runs on the worker pool; the SDK stream is a blocking iterator
+            try:
+                stream = self.client.agents.messages.stream(
+                    agent_id=agent_id,
+                    messages=[{"role": "user", "content": message}],
+                    stream_tokens=True
+                )
+                for chunk in stream:
+                    if stop.is_set():
+                        # Caller went away; closing aborts the HTTP response
+                        stream.close()
+                        return
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, _STREAM_END)
+        
+        started = time.perf_counter()
+        producer = loop.run_in_executor(self._executor, produce)
+        try:
+            builder = ResponseBuilder(separator="")
+            
+            # The whole stream counts as Letta time, chunk forwarding included
+            with timed("letta"):
+                while True:
+                    # agent_timeout bounds the gap between chunks, not the whole stream
+                    chunk = await asyncio.wait_for(chunks.get(), timeout=self.config.agent_timeout)
+                    if chunk is _STREAM_END:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    
+                    text = builder.add(chunk)
+                    if text:
+                        await on_text(text)
+                
+                await asyncio.shield(producer)
+            
+            result = builder.build(seconds=time.perf_counter() - started)
+            if result.memory_updated:
+                self._memory_edited(agent_id)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error streaming message to agent: {e}")
+            if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+                await self.cancel_runs(agent_id)
             raise
+        finally:
+            stop.set()
+            # The producer stops at its next chunk
+            if not producer.done():
+                _abandon(producer)
     
-    async def get_agent_memory(self, agent_id: str) -> Dict[str, Any]:
-        """Retrieve agent's memory blocks"""
+    async def cancel_runs(self, agent_id: str):
+        """Cancel the agent's active runs on the server (best effort)"""
         try:
-            memory = self.client.agents.memory.get(agent_id)
-            return {
-                "core_memory": str(memory),
-                "archival_memory": []
-            }
+            await self._run(self.client.agents.messages.cancel, agent_id)
+            logger.info(f"Cancelled active runs for agent {agent_id}")
+        except Exception as e:
+            # Run cancellation needs server-side support (redis); not fatal
+            logger.warning(f"Could not cancel runs for agent {agent_id}: {e}")
+    
+    def _memory_edited(self, agent_id: str):
+        """Drop the agent's cached memory blocks and tell listeners they changed"""
+        self.memory_cache.invalidate(agent_id)
+        for listener in list(self.memory_listeners):
+            listener(agent_id)
+    
+    async def get_agent_memory(self, agent_id: str, refresh: bool = False) -> Dict[str, MemoryBlock]:
+        """Agent's core memory blocks by label, from the cache unless stale or refresh is set"""
+        blocks = None if refresh else self.memory_cache.get(agent_id)
+        if blocks is not None:
+            return blocks
+        try:
+            version = self.memory_cache.version(agent_id)
+            blocks = await self._run(self._list_blocks, agent_id)
+            self.memory_cache.put(agent_id, blocks, version)
+            return blocks
         except Exception as e:
             logger.error(f"Error retrieving agent memory: {e}")
             raise
+    
+    def _list_blocks(self, agent_id: str) -> Dict[str, MemoryBlock]:
+        """Fetch every core memory block of an agent (runs on the worker pool)"""
+        return {block.label: MemoryBlock.from_sdk(block) for block in self.client.agents.blocks.list(agent_id)}
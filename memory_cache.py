@@ -0,0 +1,79 @@
+"""
+Memory block cache
+Agents' core memory blocks, reused until a memory edit or expiry
+"""
+
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBlock:
+    """One labelled core memory block (persona, human, ...)"""
+
+    __slots__ = ("label", "value", "limit", "description")
+
+    def __init__(self, label: str, value: str, limit: Optional[int] = None, description: Optional[str] = None):
+        self.label = label
+        self.value = value
+        self.limit = limit
+        self.description = description
+
+    @classmethod
+    def from_sdk(cls, block: Any) -> "MemoryBlock":
+        return cls(block.label, block.value, getattr(block, "limit", None), getattr(block, "description", None))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MemoryBlock":
+        return cls(**data)
+
+
+class MemoryCache:
+    """
+    Memory blocks by agent and label
+
+    An agent's blocks are fetched together and dropped together: when a
+    reply shows a memory-editing tool call, or once ttl seconds pass
+    (other clients, like the Letta web UI, can edit memory too). The next
+    read refetches them.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._blocks: Dict[str, Dict[str, MemoryBlock]] = {}  # agent_id -> label -> block
+        self._fetched: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}  # bumped by invalidate
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, agent_id: str) -> Optional[Dict[str, MemoryBlock]]:
+        fetched = self._fetched.get(agent_id)
+        if fetched is None or time.monotonic() - fetched >= self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._blocks[agent_id]
+
+    def version(self, agent_id: str) -> int:
+        return self._versions.get(agent_id, 0)
+
+    def put(self, agent_id: str, blocks: Dict[str, MemoryBlock], version: int):
+        """Store blocks fetched at version; a fetch that raced an invalidation is not kept"""
+        if version != self.version(agent_id):
+            return
+        self._blocks[agent_id] = blocks
+        self._fetched[agent_id] = time.monotonic()
+
+    def invalidate(self, agent_id: str):
+        self._versions[agent_id] = self.version(agent_id) + 1
+        if self._blocks.pop(agent_id, None) is not None:
+            logger.debug(f"Memory cache invalidated for agent {agent_id}")
+        self._fetched.pop(agent_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"agents": len(self._blocks), "hits": self.hits, "misses": self.misses}
@@ -4,8 +4,12 @@ Process ACP requests and format responses
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from letta_wrapper import LettaClientWrapper
+from agent_pool import AgentPool
+from batcher import MessageBatcher
+from metrics import charge
+from protocol import AgentCreateParams, AgentMessageParams, AgentToolCallParams, AgentDeleteParams
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +17,15 @@ logger = logging.getLogger(__name__)
 class MessageHandler:
     """Handle ACP method requests"""
     
-    def __init__(self, letta_client: LettaClientWrapper):
+    def __init__(
+        self,
+        letta_client: LettaClientWrapper,
+        agent_pool: Optional[AgentPool] = None,
+        batcher: Optional[MessageBatcher] = None
+    ):
         self.letta = letta_client
+        self.pool = agent_pool or AgentPool(letta_client.config, letta_client)
+        self.batcher = batcher
     
     async def handle_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -37,12 +48,12 @@ class MessageHandler:
                     "web_search",
                     "code_execution"
                 ],
-                "streaming": False,
+                "streaming": self.letta.config.enable_streaming,
                 "persistentMemory": True
             }
         }
     
-    async def handle_agent_create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def handle_agent_create(self, params: AgentCreateParams) -> Dict[str, Any]:
         """
         Create new Letta agent
         
@@ -54,11 +65,11 @@ class MessageHandler:
         Returns:
             agent_id, status, capabilities
         """
-        logger.info(f"Creating agent: {params.get('name')}")
+        logger.info(f"Creating agent: {params.name}")
         
-        name = params.get("name", "default-agent")
-        instructions = params.get("instructions", "You are a helpful coding assistant.")
-        tools = params.get("tools")
+        name = params.name
+        instructions = params.instructions
+        tools = params.tools
         
         # Create Letta agent
         agent_id = await self.letta.create_agent(
@@ -66,6 +77,7 @@ class MessageHandler:
             instructions=instructions,
             tools=tools
         )
+        self.pool.admit(agent_id, name)
         
         return {
             "agent_id": agent_id,
@@ -73,7 +85,7 @@ class MessageHandler:
             "capabilities": tools or ["send_message"]
         }
     
-    async def handle_agent_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def handle_agent_message(self, params: AgentMessageParams) -> Dict[str, Any]:
         """
         Send message to agent, return response
         
@@ -83,24 +95,31 @@ class MessageHandler:
             context: Optional context (workspace info, etc.)
         
         Returns:
-            agent_id, response messages, usage stats
+            agent_id, response text, reasoning, usage stats
         """
-        agent_id = params["agent_id"]
-        message = params["message"]
+        agent_id = params.agent_id
+        message = params.message
         
         logger.info(f"Sending message to agent {agent_id}")
         
-        # Send to Letta agent
-        response = await self.letta.send_message(agent_id, message)
+        # Send to Letta agent, folded into a batch when batching is on
+        if self.batcher is not None:
+            response = await self.batcher.send(agent_id, message)
+        else:
+            async with self.pool.use(agent_id):
+                response = await self.letta.send_message(agent_id, message)
+        charge(agent_id, response.usage)
         
         # Format for ACP
         return {
             "agent_id": agent_id,
-            "response": response.get("messages", []),
-            "usage": response.get("usage", {})
+            "response": response.text,
+            "reasoning": response.reasoning,
+            "memory_updated": response.memory_updated,
+            "usage": response.usage.to_dict() if response.usage is not None else {}
         }
     
-    async def handle_agent_tool_call(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def handle_agent_tool_call(self, params: AgentToolCallParams) -> Dict[str, Any]:
         """
         Execute tool via agent
         
@@ -112,23 +131,25 @@ class MessageHandler:
         Returns:
             tool_result
         """
-        agent_id = params["agent_id"]
-        tool_name = params["tool_name"]
-        arguments = params["arguments"]
+        agent_id = params.agent_id
+        tool_name = params.tool_name
+        arguments = params.arguments
         
         logger.info(f"Tool call: {tool_name} via agent {agent_id}")
         
         # For now, forward as a message
         # In future, could call tools directly
         tool_message = f"Use the {tool_name} tool with these arguments: {arguments}"
-        response = await self.letta.send_message(agent_id, tool_message)
+        async with self.pool.use(agent_id):
+            response = await self.letta.send_message(agent_id, tool_message)
+        charge(agent_id, response.usage)
         
         return {
             "tool_name": tool_name,
-            "result": response.get("messages", [])
+            "result": response.text
         }
     
-    async def handle_agent_delete(self, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def handle_agent_delete(self, params: AgentDeleteParams) -> Dict[str, Any]:
         """
         Delete agent
         
@@ -138,7 +159,7 @@ class MessageHandler:
         Returns:
             status
         """
-        agent_id = params["agent_id"]
+        agent_id = params.agent_id
         
         logger.info(f"Deleting agent {agent_id}")
         
@@ -0,0 +1,305 @@
+"""
+Request metrics
+Per-request latency spans and per-method / per-agent latency quantiles
+"""
+
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Deque, Tuple, Iterator
+
+from letta_messages import Usage
+
+logger = logging.getLogger(__name__)
+
+# Span stages in request order; "total" runs from frame read to write
+STAGES = ("read", "decode", "queue", "letta", "extract", "encode", "write", "total")
+QUANTILES = (0.5, 0.95, 0.99)
+# Samples kept per histogram; quantiles cover this recent window
+WINDOW_SIZE = 1024
+
+
+class RequestSpan:
+    """Time spent by one request in each stage, and the Letta usage it caused"""
+
+    __slots__ = ("method", "agent_id", "started", "queued_at", "stages", "usage")
+
+    def __init__(self, method: str, started: float):
+        self.method = method
+        self.agent_id: Optional[str] = None
+        self.started = started
+        self.queued_at = started
+        self.stages: Dict[str, float] = {}
+        self.usage: Optional[Usage] = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+# The span of the request running in the current task; set per request
+# task so Letta calls and writes deep in the stack can add to it
+current_span: ContextVar[Optional[RequestSpan]] = ContextVar("current_span", default=None)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Add the enclosed block's duration to the current request's span"""
+    span = current_span.get()
+    if span is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span.add(stage, time.perf_counter() - start)
+
+
+def charge(agent_id: str, usage: Optional[Usage]):
+    """Attribute a Letta reply's usage to the current request's span"""
+    span = current_span.get()
+    if span is None or usage is None:
+        return
+    span.usage = usage
+    # Batched replies arrive without the agent turn having set it
+    if span.agent_id is None:
+        span.agent_id = agent_id
+
+
+class LatencyHistogram:
+    """Count, sum and quantiles over the most recent samples"""
+
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def quantiles(self) -> Dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+    def summary(self) -> Dict[str, Any]:
+        quantiles = self.quantiles()
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(quantiles[0.5] * 1000, 3),
+            "p95_ms": round(quantiles[0.95] * 1000, 3),
+            "p99_ms": round(quantiles[0.99] * 1000, 3)
+        }
+
+
+class UsageTotals:
+    """Summed Letta usage for one method or agent"""
+
+    __slots__ = ("requests", "prompt_tokens", "completion_tokens", "total_tokens", "steps", "seconds")
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.steps = 0
+        self.seconds = 0.0
+
+    def add(self, usage: Usage):
+        self.requests += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        self.total_tokens += usage.total_tokens
+        self.steps += usage.step_count
+        self.seconds += usage.seconds
+
+    def merge(self, other: "UsageTotals"):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "steps": self.steps,
+            "letta_seconds": round(self.seconds, 3),
+            "tokens_per_request": round(self.total_tokens / self.requests, 1) if self.requests else 0.0,
+            "step_ms": round(self.seconds / self.steps * 1000, 3) if self.steps else 0.0
+        }
+
+
+class BridgeMetrics:
+    """
+    Latency histograms keyed by (method, stage) and (agent, stage)
+
+    Comparing the "letta" stage with "total" separates bridge overhead
+    from time spent waiting on the Letta server.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.by_method: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.by_agent: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.usage_by_method: Dict[str, UsageTotals] = {}
+        self.usage_by_agent: Dict[str, UsageTotals] = {}
+
+    def record(self, span: RequestSpan, error: bool = False):
+        """Fold a finished request's span into the histograms and usage totals"""
+        for stage, seconds in span.stages.items():
+            self._histogram(self.by_method, (span.method, stage)).observe(seconds)
+            if span.agent_id is not None:
+                self._histogram(self.by_agent, (span.agent_id, stage)).observe(seconds)
+        if error:
+            self.errors[span.method] = self.errors.get(span.method, 0) + 1
+        if span.usage is not None:
+            self._totals(self.usage_by_method, span.method).add(span.usage)
+            if span.agent_id is not None:
+                self._totals(self.usage_by_agent, span.agent_id).add(span.usage)
+
+    @staticmethod
+    def _histogram(table: Dict[Tuple[str, str], LatencyHistogram], key: Tuple[str, str]) -> LatencyHistogram:
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = LatencyHistogram()
+        return histogram
+
+    @staticmethod
+    def _totals(table: Dict[str, UsageTotals], key: str) -> UsageTotals:
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = UsageTotals()
+        return totals
+
+    def usage(self, agent_id: Optional[str] = None) -> Dict[str, Any]:
+        """Token and step totals per method and per agent for bridge/usage"""
+        agents = self.usage_by_agent
+        if agent_id is not None:
+            agents = {agent_id: agents[agent_id]} if agent_id in agents else {}
+        overall = UsageTotals()
+        for totals in self.usage_by_method.values():
+            overall.merge(totals)
+        return {
+            "methods": {name: totals.summary() for name, totals in sorted(self.usage_by_method.items())},
+            "agents": {name: totals.summary() for name, totals in sorted(agents.items())},
+            "total": overall.summary()
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Nested {method: {stage: summary}} view for bridge/metrics"""
+        def nest(table):
+            view: Dict[str, Dict[str, Any]] = {}
+            for (name, stage), histogram in sorted(table.items()):
+                view.setdefault(name, {})[stage] = histogram.summary()
+            return view
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "methods": nest(self.by_method),
+            "agents": nest(self.by_agent),
+            "errors": dict(self.errors)
+        }
+
+    def prometheus_text(self) -> str:
+        """Prometheus text exposition format (summaries)"""
+        lines = []
+        for family, label, table in (
+            ("lettabridge_request_stage_seconds", "method", self.by_method),
+            ("lettabridge_agent_stage_seconds", "agent", self.by_agent)
+        ):
+            lines.append(f"# HELP {family} Request time per stage, by {label}")
+            lines.append(f"# TYPE {family} summary")
+            for (name, stage), histogram in sorted(table.items()):
+                labels = f'{label}="{_escape(name)}",stage="{stage}"'
+                for q, value in histogram.quantiles().items():
+                    lines.append(f'{family}{{{labels},quantile="{q}"}} {value:.6f}')
+                lines.append(f"{family}_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"{family}_count{{{labels}}} {histogram.count}")
+        lines.append("# HELP lettabridge_tokens_total Letta tokens used, by method")
+        lines.append("# TYPE lettabridge_tokens_total counter")
+        for method, totals in sorted(self.usage_by_method.items()):
+            for kind in ("prompt", "completion"):
+                count = getattr(totals, f"{kind}_tokens")
+                lines.append(f'lettabridge_tokens_total{{method="{_escape(method)}",type="{kind}"}} {count}')
+        lines.append("# HELP lettabridge_request_errors_total Error responses by method")
+        lines.append("# TYPE lettabridge_request_errors_total counter")
+        for method, count in sorted(self.errors.items()):
+            lines.append(f'lettabridge_request_errors_total{{method="{_escape(method)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """Optional Prometheus export: a periodically rewritten file and/or a localhost endpoint"""
+
+    def __init__(self, metrics: BridgeMetrics, path: str = "", port: int = 0, interval: float = 10.0):
+        self.metrics = metrics
+        self.path = os.path.expanduser(path) if path else ""
+        self.port = port
+        self.interval = interval
+        self._writer: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if self.path:
+            self._writer = asyncio.create_task(self._write_loop())
+        if self.port:
+            self._server = await asyncio.start_server(self._serve_scrape, "127.0.0.1", self.port)
+            logger.info(f"Metrics endpoint on http://127.0.0.1:{self.port}/metrics")
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            self.write_file()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _write_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write_file()
+
+    def write_file(self):
+        """Atomically replace the metrics file (for node_exporter's textfile collector)"""
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.metrics.prometheus_text())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics file {self.path}: {e}")
+
+    async def _serve_scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.0 responder: any GET returns the metrics text"""
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.metrics.prometheus_text().encode("utf-8")
+            writer.write(
+                b"HTTP/1.0 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: %d\r\n\r\n" % len(body) + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,224 @@
+"""
+Prompt Builder
+Fit completion and edit prompts into a configurable size budget
+"""
+
+import json
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import BridgeConfig
+
+logger = logging.getLogger(__name__)
+
+# Context keys that may hold the open document's text
+DOCUMENT_KEYS = ("content", "text", "document", "source", "fileContent")
+# Context keys that are never dropped or summarized
+KEEP_KEYS = ("filePath", "file", "language", "languageId", "cursor", "position")
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _cursor_line(params: Dict[str, Any], context: Dict[str, Any]) -> Optional[int]:
+    cursor = params.get("cursor", context.get("cursor", context.get("position")))
+    line = cursor.get("line") if isinstance(cursor, dict) else cursor
+    return line if isinstance(line, int) else None
+
+
+def _region(params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Edit region as inclusive 0-based (first, last) line numbers"""
+    span = params.get("range") or params.get("selection")
+    if isinstance(span, dict):
+        start = (span.get("start") or {}).get("line")
+        end = (span.get("end") or {}).get("line", start)
+        if isinstance(start, int) and isinstance(end, int):
+            return min(start, end), max(start, end)
+    line = _cursor_line(params, params.get("context") or {})
+    if line is not None:
+        return line, line
+    return None
+
+
+def _summarize(value: Any) -> str:
+    if isinstance(value, str):
+        return f"<{value.count(chr(10)) + 1} lines omitted>"
+    if isinstance(value, list):
+        return f"<{len(value)} items omitted>"
+    if isinstance(value, dict):
+        return f"<{len(value)} keys omitted>"
+    return "<omitted>"
+
+
+class BuiltPrompt:
+    """A prompt ready to send plus a record of what was cut to fit"""
+
+    __slots__ = ("message", "original_bytes", "dropped_keys", "summarized_keys", "window")
+
+    def __init__(self, message: str, original_bytes: int):
+        self.message = message
+        self.original_bytes = original_bytes
+        self.dropped_keys: List[str] = []
+        self.summarized_keys: List[str] = []
+        self.window: Optional[Tuple[int, int]] = None  # 0-based, end exclusive
+
+    def metadata(self) -> Dict[str, Any]:
+        prompt_bytes = _size(self.message)
+        info: Dict[str, Any] = {
+            "bytes": prompt_bytes,
+            "trimmed_bytes": max(0, self.original_bytes - prompt_bytes)
+        }
+        if self.dropped_keys:
+            info["dropped_keys"] = self.dropped_keys
+        if self.summarized_keys:
+            info["summarized_keys"] = self.summarized_keys
+        if self.window is not None:
+            info["window"] = {"start_line": self.window[0], "end_line": self.window[1]}
+        return info
+
+
+class PromptBuilder:
+    """
+    Builds agent/complete and agent/edit prompts within prompt_max_bytes
+
+    Prompts under the budget are sent unchanged. Over budget, the open
+    document is cut to a window of lines around the cursor or edit
+    region, low-value context keys are dropped, and the largest remaining
+    context values are replaced with a short summary. The budget is in
+    UTF-8 bytes, roughly four per token.
+    """
+
+    def __init__(self, config: BridgeConfig):
+        self.max_bytes = config.prompt_max_bytes
+        self.window_lines = config.prompt_window_lines
+        self.drop_keys = config.context_drop_keys
+
+    def completion(self, params: Dict[str, Any]) -> BuiltPrompt:
+        """Completion prompt for agent/complete params"""
+        prompt = params.get("prompt", "")
+        context = params.get("context", {})
+        built = BuiltPrompt(self._complete_message(prompt, context), 0)
+        built.original_bytes = _size(built.message)
+        if not self.max_bytes or built.original_bytes <= self.max_bytes or not isinstance(context, dict):
+            return built
+
+        context = dict(context)
+        line = _cursor_line(params, context)
+        if line is not None:
+            for key in DOCUMENT_KEYS:
+                if isinstance(context.get(key), str):
+                    context[key], built.window = self._window(context[key], line, line, self.window_lines)
+
+        for key in self.drop_keys:
+            if self._fits(prompt, context):
+                break
+            if key in context:
+                del context[key]
+                built.dropped_keys.append(key)
+
+        # Summarize the biggest values first until the context fits
+        candidates = sorted(
+            (k for k in context if k not in KEEP_KEYS),
+            key=lambda k: _size(_dumps(context[k])),
+            reverse=True
+        )
+        for key in candidates:
+            if self._fits(prompt, context):
+                break
+            context[key] = _summarize(context[key])
+            built.summarized_keys.append(key)
+
+        # The prompt text leads up to the cursor, so keep its tail
+        overflow = _size(self._complete_message(prompt, context)) - self.max_bytes
+        if overflow > 0:
+            prompt = prompt.encode("utf-8")[overflow:].decode("utf-8", errors="ignore")
+
+        built.message = self._complete_message(prompt, context)
+        logger.debug(f"Completion prompt trimmed to {built.metadata()}")
+        return built
+
+    def edit(self, params: Dict[str, Any]) -> BuiltPrompt:
+        """
+        Edit prompt for agent/edit params
+
+        When the code is cut to a window, the agent only sees and rewrites
+        those lines; built.window says which lines the edit replaces.
+        """
+        instruction = params.get("instruction", "")
+        code = params.get("code", "")
+        file_path = params.get("filePath", "")
+        built = BuiltPrompt(self._edit_message(file_path, instruction, code), 0)
+        built.original_bytes = _size(built.message)
+        if not self.max_bytes or built.original_bytes <= self.max_bytes:
+            return built
+
+        region = _region(params)
+        if region is None:
+            logger.warning("Edit prompt exceeds prompt_max_bytes but has no range or cursor; sending whole file")
+            return built
+
+        # Narrow the surrounding window until the prompt fits; the edit
+        # region itself is always kept
+        margin = self.window_lines
+        while True:
+            text, window = self._window(code, region[0], region[1], margin, markers=False)
+            message = self._edit_message(file_path, instruction, text, window, code.count("\n") + 1)
+            if _size(message) <= self.max_bytes or margin == 0:
+                break
+            margin //= 2
+
+        built.message = message
+        built.window = window
+        logger.debug(f"Edit prompt trimmed to {built.metadata()}")
+        return built
+
+    def _fits(self, prompt: str, context: Dict[str, Any]) -> bool:
+        return _size(self._complete_message(prompt, context)) <= self.max_bytes
+
+    @staticmethod
+    def _window(text: str, first: int, last: int, margin: int,
+                markers: bool = True) -> Tuple[str, Tuple[int, int]]:
+        """Lines first-margin .. last+margin of text, with omission markers"""
+        lines = text.split("\n")
+        start = max(0, min(first, len(lines) - 1) - margin)
+        end = min(len(lines), last + margin + 1)
+        kept = lines[start:end]
+        if markers:
+            if start:
+                kept.insert(0, f"... {start} lines omitted ...")
+            if end < len(lines):
+                kept.append(f"... {len(lines) - end} lines omitted ...")
+        return "\n".join(kept), (start, end)
+
+    @staticmethod
+    def _complete_message(prompt: str, context: Any) -> str:
+        return f"""Code completion request:
+{prompt}
+
+Context: {_dumps(context)}"""
+
+    @staticmethod
+    def _edit_message(file_path: str, instruction: str, code: str,
+                      window: Optional[Tuple[int, int]] = None, total_lines: int = 0) -> str:
+        if window is None:
+            return f"""Edit request:
+File: {file_path}
+Instruction: {instruction}
+
+Current code:
+{code}
+
+Please provide the edited code."""
+        return f"""Edit request:
+File: {file_path}
+Instruction: {instruction}
+
+Current code (lines {window[0] + 1}-{window[1]} of {total_lines}, the rest of the file is unchanged):
+{code}
+
+Please provide the edited version of these lines only."""
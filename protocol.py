@@ -25,8 +25,8 @@ class JSONRPCResponse(BaseModel):
 
 class AgentCreateParams(BaseModel):
     """Parameters for agent/create method"""
-    name: str
-    instructions: str
+    name: str = "default-agent"
+    instructions: str = "You are a helpful coding assistant."
     tools: Optional[List[str]] = None
     memory_config: Optional[Dict[str, Any]] = None
 
@@ -45,8 +45,13 @@ class AgentToolCallParams(BaseModel):
     arguments: Dict[str, Any]
 
 
+class AgentDeleteParams(BaseModel):
+    """Parameters for agent/delete method"""
+    agent_id: str
+
+
 # ACP Method Registry
-# Maps ACP method names to handler method names
+# Maps ACP method names to MessageHandler method names
 ACP_METHODS = {
     "initialize": "handle_initialize",
     "agent/create": "handle_agent_create",
@@ -54,4 +59,58 @@ ACP_METHODS = {
     "agent/tool_call": "handle_agent_tool_call",
     "agent/delete": "handle_agent_delete",
     "agent/list": "handle_agent_list",
-}
\ No newline at end of file
+}
+
+# Bridge Method Registry
+# Maps ACP method names to ACPLettaBridge method names; these take
+# precedence over ACP_METHODS when both define a method
+BRIDGE_METHODS = {
+    "initialize": "_handle_initialize",
+    "agent/complete": "_handle_complete",
+    "agent/edit": "_handle_edit",
+    "agent/cancel": "_handle_cancel",
+    "agent/pool": "_handle_agent_pool",
+    "agent/memory": "_handle_memory",
+    "bridge/metrics": "_handle_metrics",
+    "bridge/usage": "_handle_usage",
+    "document/open": "_handle_document_open",
+    "document/change": "_handle_document_change",
+    "document/close": "_handle_document_close",
+    "shutdown": "_handle_shutdown",
+}
+
+
+# Dispatch priorities (lower runs first). Control methods bypass the
+# concurrency cap entirely.
+CONTROL_PRIORITY = 0
+DEFAULT_PRIORITY = 2
+METHOD_PRIORITIES = {
+    "initialize": CONTROL_PRIORITY,
+    "agent/cancel": CONTROL_PRIORITY,
+    "shutdown": CONTROL_PRIORITY,
+    "agent/list": CONTROL_PRIORITY,
+    "agent/pool": CONTROL_PRIORITY,
+    "bridge/metrics": CONTROL_PRIORITY,
+    "bridge/usage": CONTROL_PRIORITY,
+    # Document sync never waits, so changes apply in the order they arrive
+    "document/open": CONTROL_PRIORITY,
+    "document/change": CONTROL_PRIORITY,
+    "document/close": CONTROL_PRIORITY,
+    "agent/complete": 1,
+    "agent/memory": 1,
+    "agent/edit": 2,
+    "agent/message": 2,
+    "agent/tool_call": 2,
+    "agent/create": 3,
+    "agent/delete": 3,
+}
+
+# Methods that take their agent's turn, and the param naming the agent
+# (None: params.agent names a pooled agent, else the bridge's default).
+# They queue per agent on arrival, before priority scheduling.
+AGENT_TURN_METHODS = {
+    "agent/complete": None,
+    "agent/edit": None,
+    "agent/message": "agent_id",
+    "agent/tool_call": "agent_id",
+}
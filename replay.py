@@ -0,0 +1,275 @@
+"""
+Session replay
+Feed a recorded session back through the bridge against a stubbed Letta backend
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple, Deque, Callable, Awaitable
+
+from config import BridgeConfig
+from framing import FrameDecoder, encode_frame
+from letta_messages import AgentResponse
+from memory_cache import MemoryBlock
+from transport import StdioTransport
+from acp_letta_bridge import ACPLettaBridge
+
+logger = logging.getLogger(__name__)
+
+
+def load_session(path: str) -> List[Dict[str, Any]]:
+    """Entries of a session log, header excluded"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [e for e in entries if e.get("kind") != "session"]
+
+
+class ReplayLettaClient:
+    """
+    Stub Letta backend answering from a recorded session
+
+    Calls are matched to recorded ones by (call, target) in recorded
+    order and take their recorded duration divided by speed. Calls with
+    no recording left get an empty reply at once and are counted.
+    """
+
+    def __init__(self, config: BridgeConfig, calls: List[Dict[str, Any]], speed: float = 1.0):
+        self.config = config
+        self.speed = speed
+        self.agents: Dict[str, str] = {}
+        self.memory_listeners: List[Callable[[str], None]] = []
+        self.unmatched = 0
+        self._calls: Dict[Tuple[str, Optional[str]], Deque[Dict[str, Any]]] = {}
+        for call in calls:
+            self._calls.setdefault((call["call"], call.get("target")), deque()).append(call)
+
+    async def _sleep(self, seconds: float):
+        if self.speed > 0 and seconds > 0:
+            await asyncio.sleep(seconds / self.speed)
+
+    async def _replay(self, call: str, target: Optional[str]) -> Optional[Dict[str, Any]]:
+        recorded = self._calls.get((call, target))
+        if not recorded:
+            self.unmatched += 1
+            logger.debug(f"No recorded {call} left for {target}")
+            return None
+        entry = recorded.popleft()
+        if "chunks" not in entry:
+            await self._sleep(entry.get("duration", 0.0))
+        if "error" in entry:
+            raise RuntimeError(entry["error"])
+        return entry
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def get_or_create_agent(self, agent_name: str, agent_config: Dict[str, Any]) -> str:
+        entry = await self._replay("get_or_create_agent", agent_name)
+        agent_id = entry["result"] if entry else f"replay-{agent_name}"
+        self.agents[agent_name] = agent_id
+        return agent_id
+
+    async def create_agent(self, name: str, instructions: str, tools: Optional[List[str]] = None) -> str:
+        entry = await self._replay("create_agent", name)
+        agent_id = entry["result"] if entry else f"replay-{name}"
+        self.agents[name] = agent_id
+        return agent_id
+
+    async def delete_agent(self, agent_id: str):
+        await self._replay("delete_agent", agent_id)
+
+    async def send_message(self, agent_id: str, message: str) -> AgentResponse:
+        return await self.send_messages(agent_id, [message])
+
+    async def send_messages(self, agent_id: str, messages: List[str]) -> AgentResponse:
+        entry = await self._replay("send_messages", agent_id)
+        return self._reply(agent_id, entry)
+
+    def _reply(self, agent_id: str, entry: Optional[Dict[str, Any]]) -> AgentResponse:
+        result = AgentResponse.from_dict(entry["result"]) if entry else AgentResponse()
+        if result.memory_updated:
+            for listener in list(self.memory_listeners):
+                listener(agent_id)
+        return result
+
+    async def stream_message(self, agent_id: str, message: str,
+                             on_text: Callable[[str], Awaitable[None]]) -> AgentResponse:
+        entry = await self._replay("stream_message", agent_id)
+        if entry is None:
+            return self._reply(agent_id, None)
+        elapsed = 0.0
+        for offset, text in entry["chunks"]:
+            await self._sleep(offset - elapsed)
+            elapsed = offset
+            await on_text(text)
+        await self._sleep(entry.get("duration", 0.0) - elapsed)
+        return self._reply(agent_id, entry)
+
+    async def cancel_runs(self, agent_id: str):
+        await self._replay("cancel_runs", agent_id)
+
+    async def get_agent_memory(self, agent_id: str, refresh: bool = False) -> Dict[str, MemoryBlock]:
+        entry = await self._replay("get_agent_memory", agent_id)
+        if entry is None:
+            return {}
+        return {label: MemoryBlock.from_dict(block) for label, block in entry["result"].items()}
+
+
+class CaptureWriter:
+    """Transport writer that decodes the bridge's outbound frames"""
+
+    def __init__(self, on_message: Callable[[Dict[str, Any]], None]):
+        self.decoder = FrameDecoder()
+        self.on_message = on_message
+
+    def write(self, data: bytes):
+        self.decoder.feed(data)
+        while True:
+            body = self.decoder.next_frame()
+            if body is None:
+                break
+            self.on_message(json.loads(body))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _latencies(inbound: Dict[Any, Tuple[float, str]], outbound: Dict[Any, float]) -> Dict[str, List[float]]:
+    by_method: Dict[str, List[float]] = {}
+    for request_id, (sent, method) in inbound.items():
+        if request_id in outbound:
+            by_method.setdefault(method, []).append(outbound[request_id] - sent)
+    return by_method
+
+
+def _comparable(message: Dict[str, Any]) -> Any:
+    """Response content without timing-dependent metadata"""
+    if "error" in message:
+        return {"error": message["error"].get("code")}
+    result = message.get("result")
+    if isinstance(result, dict):
+        return {k: v for k, v in result.items() if k != "metadata"}
+    return result
+
+
+async def replay(path: str, speed: float = 1.0, config: Optional[BridgeConfig] = None) -> Dict[str, Any]:
+    """
+    Replay a recorded session and report latencies against the recording
+
+    speed scales both request pacing and Letta call durations; 0 sends
+    every request at once with instant Letta replies.
+    """
+    config = config or BridgeConfig(record_path="")
+    entries = load_session(path)
+    stub = ReplayLettaClient(config, [e for e in entries if e["kind"] == "letta"], speed)
+    bridge = ACPLettaBridge(config, letta_client=stub)
+
+    recorded_in: Dict[Any, Tuple[float, str]] = {}
+    recorded_out: Dict[Any, float] = {}
+    recorded_results: Dict[Any, Any] = {}
+    for entry in entries:
+        message = entry.get("message") or {}
+        if entry["kind"] == "in" and "id" in message:
+            recorded_in[message["id"]] = (entry["t"], message.get("method"))
+        elif entry["kind"] == "out" and "id" in message and ("result" in message or "error" in message):
+            recorded_out[message["id"]] = entry["t"]
+            recorded_results[message["id"]] = _comparable(message)
+
+    replay_in: Dict[Any, Tuple[float, str]] = {}
+    replay_out: Dict[Any, float] = {}
+    mismatches = []
+
+    def on_message(message: Dict[str, Any]):
+        request_id = message.get("id")
+        if request_id is None or not ("result" in message or "error" in message):
+            return
+        replay_out[request_id] = time.perf_counter()
+        if request_id in recorded_results and _comparable(message) != recorded_results[request_id]:
+            mismatches.append(request_id)
+
+    reader = asyncio.StreamReader()
+    bridge.start_initialize()
+    serving = asyncio.create_task(bridge.serve(StdioTransport(reader, CaptureWriter(on_message))))
+
+    started = time.perf_counter()
+    for entry in entries:
+        if entry["kind"] != "in":
+            continue
+        if speed > 0:
+            delay = entry["t"] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        message = entry.get("message")
+        body = json.dumps(message).encode("utf-8") if message is not None else entry["raw"].encode("utf-8")
+        if isinstance(message, dict) and "id" in message:
+            replay_in[message["id"]] = (time.perf_counter(), message.get("method"))
+        reader.feed_data(encode_frame(body))
+        # Let the bridge pick the frame up before the next one is due
+        await asyncio.sleep(0)
+    reader.feed_eof()
+    await serving
+    duration = time.perf_counter() - started
+    if bridge._startup is not None:
+        bridge._startup.cancel()
+
+    recorded = _latencies(recorded_in, recorded_out)
+    replayed = _latencies(replay_in, replay_out)
+    methods = {}
+    for method, values in sorted(replayed.items(), key=lambda item: str(item[0])):
+        before = recorded.get(method, [])
+        methods[method] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 0.5) * 1000, 2),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+            "recorded_p50_ms": round(_percentile(before, 0.5) * 1000, 2),
+            "recorded_p99_ms": round(_percentile(before, 0.99) * 1000, 2)
+        }
+
+    return {
+        "session": path,
+        "speed": speed,
+        "requests": len(replay_in),
+        "responses": len(replay_out),
+        "duration_s": round(duration, 3),
+        "mismatched_responses": sorted(mismatches, key=str),
+        "unmatched_letta_calls": stub.unmatched,
+        "methods": methods
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a session recorded with BRIDGE_RECORD_PATH; BRIDGE_* variables tune the bridge"
+    )
+    parser.add_argument("session", help="JSONL session log")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time scale, e.g. 4 for 4x faster; 0 for as fast as possible")
+    parser.add_argument("--output", help="save the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(replay(args.session, args.speed))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Response cache
+Bounded LRU/TTL cache for agent completion responses
+"""
+
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class ResponseCache:
+    """LRU cache with per-entry expiry, keyed on agent, method and params"""
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(agent_id: str, method: str, params: Dict[str, Any]) -> str:
+        """Stable hash of the request; params are canonicalized first"""
+        canonical = json.dumps(
+            [agent_id, method, params],
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a live cached response, or None"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a live response is cached; counters are left alone"""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Store a response, evicting the least recently used entry if full"""
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and occupancy"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size
+        }
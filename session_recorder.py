@@ -0,0 +1,138 @@
+"""
+Session recorder
+Capture inbound frames, outbound frames and Letta calls to a JSONL log
+"""
+
+import json
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+
+from letta_messages import AgentResponse
+from memory_cache import MemoryBlock
+
+logger = logging.getLogger(__name__)
+
+LOG_VERSION = 1
+
+
+def _plain(result: Any) -> Any:
+    """JSON-safe copy of a Letta call result; SDK objects are dropped"""
+    if isinstance(result, AgentResponse):
+        return result.to_dict()
+    if isinstance(result, dict):
+        return {k: v.to_dict() if isinstance(v, MemoryBlock) else v for k, v in result.items()}
+    return result
+
+
+class SessionRecorder:
+    """
+    Append-only JSONL log of one bridge session
+
+    Every line has "t" (seconds since the session started) and "kind":
+    "in" and "out" carry a JSON-RPC message, "letta" carries one Letta
+    call with its target, arguments, duration and result or error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.perf_counter()
+        # Line buffered, so the log survives a crash or kill up to the last entry
+        self._file = open(path, "w", encoding="utf-8", buffering=1)
+        self._write({
+            "kind": "session",
+            "version": LOG_VERSION,
+            "started_at": datetime.now(timezone.utc).isoformat()
+        })
+        logger.info(f"Recording session to {path}")
+
+    def now(self) -> float:
+        return time.perf_counter() - self.started
+
+    def record(self, kind: str, **fields):
+        self._write({"t": round(self.now(), 6), "kind": kind, **fields})
+
+    def _write(self, entry: Dict[str, Any]):
+        if self._file.closed:
+            return
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class RecordingLettaClient:
+    """LettaClientWrapper proxy that logs every Letta call it forwards"""
+
+    def __init__(self, client, recorder: SessionRecorder):
+        self._client = client
+        self._recorder = recorder
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    async def _call(self, call: str, target: Optional[str], args: Dict[str, Any],
+                    coro: Awaitable[Any], chunks: Optional[List] = None) -> Any:
+        started = self._recorder.now()
+        entry: Dict[str, Any] = {"call": call, "target": target, "args": args}
+        try:
+            result = await coro
+            entry["result"] = _plain(result)
+            return result
+        except Exception as e:
+            entry["error"] = str(e)
+            raise
+        finally:
+            entry["duration"] = round(self._recorder.now() - started, 6)
+            if chunks is not None:
+                entry["chunks"] = chunks
+            self._recorder.record("letta", **entry)
+
+    async def get_or_create_agent(self, agent_name: str, agent_config: Dict[str, Any]) -> str:
+        return await self._call(
+            "get_or_create_agent", agent_name, {},
+            self._client.get_or_create_agent(agent_name, agent_config)
+        )
+
+    async def create_agent(self, name: str, instructions: str, tools: Optional[List[str]] = None) -> str:
+        return await self._call(
+            "create_agent", name, {"tools": tools},
+            self._client.create_agent(name, instructions, tools)
+        )
+
+    async def delete_agent(self, agent_id: str):
+        return await self._call("delete_agent", agent_id, {}, self._client.delete_agent(agent_id))
+
+    async def send_message(self, agent_id: str, message: str) -> AgentResponse:
+        return await self.send_messages(agent_id, [message])
+
+    async def send_messages(self, agent_id: str, messages: List[str]) -> AgentResponse:
+        return await self._call(
+            "send_messages", agent_id, {"messages": messages},
+            self._client.send_messages(agent_id, messages)
+        )
+
+    async def stream_message(self, agent_id: str, message: str,
+                             on_text: Callable[[str], Awaitable[None]]) -> AgentResponse:
+        started = self._recorder.now()
+        chunks: List = []  # [seconds after the call started, text]
+
+        async def forward(text: str):
+            chunks.append([round(self._recorder.now() - started, 6), text])
+            await on_text(text)
+
+        return await self._call(
+            "stream_message", agent_id, {"messages": [message]},
+            self._client.stream_message(agent_id, message, forward), chunks
+        )
+
+    async def cancel_runs(self, agent_id: str):
+        return await self._call("cancel_runs", agent_id, {}, self._client.cancel_runs(agent_id))
+
+    async def get_agent_memory(self, agent_id: str, refresh: bool = False) -> Dict[str, MemoryBlock]:
+        return await self._call(
+            "get_agent_memory", agent_id, {"refresh": refresh},
+            self._client.get_agent_memory(agent_id, refresh)
+        )
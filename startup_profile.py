@@ -0,0 +1,95 @@
+"""
+Startup profiler
+Per-module import time and time to the first initialize reply (--profile-startup)
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+from typing import Dict, Any, List, Tuple
+
+from framing import FrameDecoder, encode_frame
+
+BRIDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+ENTRY_MODULE = "acp_letta_bridge"
+
+
+def import_times(module: str = ENTRY_MODULE) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every import made by module, via -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BRIDGE_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def time_to_initialize() -> float:
+    """Seconds from spawning the bridge to its initialize reply"""
+    env = dict(os.environ, BRIDGE_LOG_LEVEL="WARNING")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BRIDGE_DIR, f"{ENTRY_MODULE}.py")],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env
+    )
+    try:
+        request = {"jsonrpc": "2.0", "method": "initialize", "params": {}, "id": 1}
+        process.stdin.write(encode_frame(json.dumps(request).encode("utf-8")))
+        process.stdin.flush()
+
+        decoder = FrameDecoder()
+        while True:
+            body = decoder.next_frame()
+            if body is not None:
+                return time.perf_counter() - start
+            chunk = process.stdout.read1(65536)
+            if not chunk:
+                raise RuntimeError("Bridge exited before answering initialize")
+            decoder.feed(chunk)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def profile_startup(top: int = 15) -> Dict[str, Any]:
+    """Print a startup report and return it"""
+    times = import_times()
+    root = next((t for t in times if t[0] == ENTRY_MODULE), None)
+    # Top-level packages only; their cumulative time includes submodules
+    packages = {}
+    for name, _, cumulative in times:
+        package = name.split(".")[0]
+        if name == package:
+            packages[package] = max(packages.get(package, 0), cumulative)
+
+    report = {
+        "import_ms": round(root[2] / 1000, 1) if root else None,
+        "letta_client_at_startup": "letta_client" in packages,
+        "modules_ms": {
+            name: round(us / 1000, 1)
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+            if name != ENTRY_MODULE
+        },
+        "initialize_reply_ms": round(time_to_initialize() * 1000, 1)
+    }
+
+    print(f"Import of {ENTRY_MODULE}: {report['import_ms']} ms")
+    print(f"letta_client imported at startup: {report['letta_client_at_startup']}")
+    print(f"Time to initialize reply: {report['initialize_reply_ms']} ms")
+    print("\nSlowest top-level imports (cumulative ms):")
+    for name, ms in report["modules_ms"].items():
+        print(f"  {ms:8.1f}  {name}")
+    return report
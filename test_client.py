@@ -7,6 +7,11 @@ import subprocess
 import json
 import sys
 
+from framing import FrameDecoder, encode_frame
+
+# One decoder per bridge process, so bytes read past a frame are kept
+_decoders = {}
+
 
 def send_request(process, request_id, method, params=None):
     """Send JSON-RPC request to bridge server"""
@@ -18,43 +23,30 @@ def send_request(process, request_id, method, params=None):
     if params:
         request["params"] = params
     
-    # Serialize
-    body = json.dumps(request)
-    content_length = len(body.encode('utf-8'))
-    
     # Send with Content-Length framing
-    message = f"Content-Length: {content_length}\r
-\r
-{body}"
-    process.stdin.write(message)
+    process.stdin.write(encode_frame(json.dumps(request).encode("utf-8")))
     process.stdin.flush()
     
-    # Read response
-    # (simplified - real implementation needs proper framing parser)
     return read_response(process)
 
 
 def read_response(process):
     """Read JSON-RPC response"""
-    # Read headers
+    decoder = _decoders.setdefault(process.pid, FrameDecoder())
     while True:
-        line = process.stdout.readline().decode('utf-8')
-        if line == "\r
-" or line == "
-":
-            break
-        if line.startswith("Content-Length:"):
-            length = int(line.split(":")[1].strip())
-    
-    # Read body
-    body = process.stdout.read(length).decode('utf-8')
-    return json.loads(body)
+        body = decoder.next_frame()
+        if body is not None:
+            return json.loads(body)
+        data = process.stdout.read1(65536)
+        if not data:
+            raise EOFError("Bridge closed stdout")
+        decoder.feed(data)
 
 
 def main():
     # Start bridge server
     process = subprocess.Popen(
-        ["python", "-m", "src.acp_server"],
+        [sys.executable, "acp_letta_bridge.py"],
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
@@ -64,8 +56,7 @@ def main():
         # Test 1: Initialize
         print("Test 1: Initialize")
         response = send_request(process, 1, "initialize")
-        print(f"Response: {response}
-")
+        print(f"Response: {response}\n")
         
         # Test 2: Create agent
         print("Test 2: Create agent")
@@ -74,8 +65,7 @@ def main():
             "instructions": "You are a helpful coding assistant"
         })
         agent_id = response["result"]["agent_id"]
-        print(f"Created agent: {agent_id}
-")
+        print(f"Created agent: {agent_id}\n")
         
         # Test 3: Send message
         print("Test 3: Send message")
@@ -83,18 +73,16 @@ def main():
             "agent_id": agent_id,
             "message": "Hello! Can you help me write a Python function?"
         })
-        print(f"Agent response: {response['result']['response']}
-")
+        print(f"Agent response: {response['result']['response']}\n")
         
         # Test 4: List agents
         print("Test 4: List agents")
         response = send_request(process, 4, "agent/list")
-        print(f"Agents: {response}
-")
+        print(f"Agents: {response}\n")
         
     finally:
         process.terminate()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
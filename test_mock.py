@@ -3,11 +3,18 @@
 Mock test for bridge - tests our code without needing Letta server
 """
 
+import os
 import sys
 import json
+import asyncio
+import tempfile
 from unittest.mock import Mock, AsyncMock, patch
+
+# Keep the on-disk agent id cache out of the user's home during tests
+os.environ.setdefault("BRIDGE_AGENT_CACHE_PATH", "")
 from config import BridgeConfig
 from letta_wrapper import LettaClientWrapper
+from letta_messages import AgentResponse
 from acp_letta_bridge import ACPLettaBridge
 
 def test_config():
@@ -69,8 +76,8 @@ async def test_request_handling():
         mock_client.agents.list = Mock(return_value=[])
         mock_client.agents.create = Mock(return_value=Mock(id="test-agent-123"))
         mock_client.agents.messages = Mock()
-        mock_client.agents.messages.send = Mock(return_value=Mock(
-            messages=[Mock(text="Hello from Letta!")]
+        mock_client.agents.messages.create = Mock(return_value=Mock(
+            messages=[Mock(text="Hello from Letta!", function_call=None)]
         ))
         MockLetta.return_value = mock_client
         
@@ -108,6 +115,1180 @@ async def test_request_handling():
         
         return True
 
+async def test_concurrent_dispatch():
+    """Test a slow request does not block later ones"""
+    print("\nTesting concurrent dispatch...")
+    
+    config = BridgeConfig(max_concurrent_requests=2)
+    bridge = ACPLettaBridge(config)
+    bridge.agent_id = "test-agent-123"
+    
+    async def slow_send(agent_id, message):
+        await asyncio.sleep(0.2)
+        return AgentResponse("slow")
+    
+    bridge.letta_client.send_message = slow_send
+    
+    written = []
+    async def capture(message):
+        written.append(message)
+    bridge.write_message = capture
+    
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 1})
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "initialize", "params": {}, "id": 2})
+    await asyncio.sleep(0.05)
+    assert [m["id"] for m in written] == [2]
+    print("✓ Initialize answered while completion in flight")
+    
+    await bridge.drain()
+    assert [m["id"] for m in written] == [2, 1]
+    assert not bridge._tasks
+    print("✓ All in-flight requests drained")
+    
+    events = []
+    async def send(agent_id, message):
+        await asyncio.sleep(0.05)
+        events.append("sent")
+        return AgentResponse("done")
+    bridge.letta_client.send_message = send
+    bridge.letta_client.disconnect = AsyncMock(side_effect=lambda: events.append("disconnect"))
+    transport = Mock()
+    transport.read_message = AsyncMock(side_effect=[
+        b'{"jsonrpc": "2.0", "method": "agent/message", "params": {"agent_id": "a-1", "message": "hi"}, "id": 3}',
+        b'{"jsonrpc": "2.0", "method": "shutdown", "id": 4}'
+    ])
+    transport.last_read_time = 0.0
+    await bridge.serve(transport)
+    assert events == ["sent", "disconnect"]
+    responses = {m["id"]: m for m in written}
+    assert "result" in responses[3] and responses[4]["result"]["status"] == "shutdown"
+    print("✓ Shutdown disconnects only after in-flight requests finish")
+    
+    return True
+
+async def test_transport_framing():
+    """Test frames are parsed from partial reads"""
+    print("\nTesting transport framing...")
+    
+    from transport import StdioTransport
+    
+    reader = asyncio.StreamReader()
+    transport = StdioTransport(reader, Mock())
+    
+    body = json.dumps({"jsonrpc": "2.0", "method": "initialize", "id": 1}).encode()
+    data = b"Content-Length: %d\r\n\r\n" % len(body) + body
+    
+    async def feed():
+        for i in range(0, len(data), 7):
+            reader.feed_data(data[i:i + 7])
+            await asyncio.sleep(0)
+        reader.feed_eof()
+    
+    feeder = asyncio.create_task(feed())
+    assert await transport.read_message() == body
+    assert await transport.read_message() is None
+    await feeder
+    print("✓ Frame reassembled from partial reads")
+    
+    reader = asyncio.StreamReader()
+    writer = Mock()
+    writer.drain = AsyncMock()
+    transport = StdioTransport(reader, writer)
+    reader.feed_data(b"Content-Length: abc\r\n\r\n{}" + b"Content-Length: -2\r\n\r\n{}" + data)
+    reader.feed_eof()
+    assert await transport.read_message() == body
+    errors = [json.loads(call.args[0].split(b"\r\n\r\n", 1)[1]) for call in writer.write.call_args_list]
+    assert [e["error"]["code"] for e in errors] == [-32700, -32700]
+    print("✓ Bad Content-Length answered with parse errors, next frame still read")
+    
+    return True
+
+def test_framing_codec():
+    """Test frame codec is byte-correct for non-ASCII bodies"""
+    print("\nTesting framing codec...")
+    
+    from framing import FrameDecoder, encode_frame
+    
+    body = json.dumps({"completion": "naïve → 完成"}, ensure_ascii=False).encode("utf-8")
+    frame = encode_frame(body)
+    assert frame.startswith(b"Content-Length: %d\r\n\r\n" % len(body))
+    
+    decoder = FrameDecoder()
+    decoder.feed(frame + frame[:10])
+    assert decoder.next_frame() == body
+    assert decoder.next_frame() is None
+    decoder.feed(frame[10:] + b"Content-Length: 2\n\n{}")
+    assert decoder.next_frame() == body
+    assert decoder.next_frame() == b"{}"
+    assert decoder.buffered == 0
+    print("✓ Non-ASCII frames round-trip across chunk boundaries")
+    
+    from framing import FrameError
+    decoder.feed(b"Content-Length: -5\r\n\r\n{}" + frame)
+    try:
+        decoder.next_frame()
+        assert False, "negative Content-Length accepted"
+    except FrameError:
+        pass
+    assert decoder.next_frame() == body and decoder.buffered == 0
+    print("✓ Negative Content-Length rejected, decoder resyncs on the next header")
+
+async def test_sdk_off_event_loop():
+    """Test blocking SDK calls run on the worker pool with a timeout"""
+    print("\nTesting SDK calls off the event loop...")
+    
+    import time
+    
+    config = BridgeConfig(agent_timeout=1)
+    client = LettaClientWrapper(config)
+    client.client = Mock()
+    client.client.agents.messages.create = Mock(side_effect=lambda **kw: time.sleep(2))
+    
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.05)
+            ticks += 1
+    
+    ticking = asyncio.create_task(ticker())
+    try:
+        await client.send_message("test-agent-123", "hello")
+        assert False, "expected timeout"
+    except TimeoutError:
+        pass
+    ticking.cancel()
+    assert ticks >= 10
+    print("✓ Event loop kept running and call timed out after agent_timeout")
+    
+    from agent_pool import AgentPool
+    client.config.agent_timeout = 0.1
+    started = []
+    def create(**kwargs):
+        started.append(time.perf_counter())
+        if len(started) == 1:
+            time.sleep(0.3)
+        return Mock(messages=[], usage=None)
+    client.client.agents.messages.create = Mock(side_effect=create)
+    client.client.agents.messages.cancel.reset_mock()
+    pool = AgentPool(client.config, client)
+    
+    async def call():
+        async with pool.use("test-agent-123"):
+            return await client.send_message("test-agent-123", "hello")
+    
+    results = await asyncio.gather(call(), call(), return_exceptions=True)
+    assert isinstance(results[0], TimeoutError) and not isinstance(results[1], Exception)
+    assert started[1] - started[0] >= 0.29
+    client.client.agents.messages.cancel.assert_called_once_with("test-agent-123")
+    assert pool.stats()["busy"] == 0
+    print("✓ Timed-out call keeps the agent's turn until its worker returns; run cancelled")
+    
+    await client.disconnect()
+    return True
+
+async def test_streaming_completion():
+    """Test completion chunks are forwarded as notifications"""
+    print("\nTesting streaming completion...")
+    
+    config = BridgeConfig(enable_streaming=True)
+    bridge = ACPLettaBridge(config)
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.client = Mock()
+    bridge.letta_client.client.agents.messages.stream = Mock(return_value=iter([
+        Mock(message_type="reasoning_message", reasoning="The user wants a function"),
+        Mock(message_type="assistant_message", content="def "),
+        Mock(message_type="assistant_message", content="hello():"),
+    ]))
+    
+    written = []
+    async def capture(message):
+        written.append(message)
+    bridge.write_message = capture
+    
+    response = await bridge.handle_request({
+        "jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "def"}, "id": 7
+    })
+    assert [m["params"]["delta"] for m in written] == ["def ", "hello():"]
+    assert all(m["method"] == "agent/streamChunk" and m["params"]["requestId"] == 7 for m in written)
+    assert response["result"]["completion"] == "def hello():"
+    print("✓ Chunks forwarded before final response")
+    
+    response = await bridge.handle_request({"jsonrpc": "2.0", "method": "initialize", "id": 8})
+    assert response["result"]["capabilities"]["streaming"] is True
+    print("✓ Streaming capability advertised")
+    
+    return True
+
+async def test_cancel_inflight():
+    """Test agent/cancel aborts the named in-flight request"""
+    print("\nTesting request cancellation...")
+    
+    config = BridgeConfig()
+    bridge = ACPLettaBridge(config)
+    bridge.agent_id = "test-agent-123"
+    
+    async def slow_send(agent_id, message):
+        await asyncio.sleep(5)
+    
+    bridge.letta_client.send_message = slow_send
+    bridge.letta_client.cancel_runs = AsyncMock()
+    
+    written = []
+    async def capture(message):
+        written.append(message)
+    bridge.write_message = capture
+    
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 1})
+    await asyncio.sleep(0)
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/cancel", "params": {"id": 1}, "id": 2})
+    await asyncio.wait_for(bridge.drain(), timeout=1)
+    
+    responses = {m["id"]: m for m in written}
+    assert responses[1]["error"]["code"] == -32800
+    assert responses[2]["result"]["status"] == "cancelled"
+    bridge.letta_client.cancel_runs.assert_awaited_once_with("test-agent-123")
+    assert not bridge._inflight
+    print("✓ In-flight completion cancelled with JSON-RPC error")
+    
+    bridge.letta_client.cancel_runs.reset_mock()
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/message", "id": 3,
+                           "params": {"agent_id": "other-agent", "message": "hi"}})
+    await asyncio.sleep(0)
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/cancel", "params": {"id": 3}, "id": 4})
+    await asyncio.wait_for(bridge.drain(), timeout=1)
+    bridge.letta_client.cancel_runs.assert_awaited_once_with("other-agent")
+    assert not bridge._request_agents
+    print("✓ Cancelled agent/message aborts its own agent's run")
+    
+    # Daemon sessions share one pool: cancelling in one session must not
+    # abort the agent's run for another session's request
+    config = BridgeConfig(enable_response_cache=False, max_requests_per_agent=2)
+    first = ACPLettaBridge(config)
+    first.agent_id = "test-agent-123"
+    first.letta_client.send_message = slow_send
+    first.letta_client.cancel_runs = AsyncMock()
+    second = ACPLettaBridge(config, letta_client=first.letta_client, agent_pool=first.agent_pool)
+    second.agent_id = "test-agent-123"
+    for bridge in (first, second):
+        bridge.write_message = capture
+        await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 1})
+    await asyncio.sleep(0)
+    await second.dispatch({"jsonrpc": "2.0", "method": "agent/cancel", "params": {"id": 1}, "id": 2})
+    await asyncio.wait_for(second.drain(), timeout=1)
+    first.letta_client.cancel_runs.assert_not_awaited()
+    await first.dispatch({"jsonrpc": "2.0", "method": "agent/cancel", "params": {"id": 1}, "id": 2})
+    await asyncio.wait_for(first.drain(), timeout=1)
+    first.letta_client.cancel_runs.assert_awaited_once_with("test-agent-123")
+    print("✓ Server-side run kept while another session uses the agent")
+    
+    return True
+
+async def test_completion_cache():
+    """Test identical completions are served from the cache"""
+    print("\nTesting completion cache...")
+    
+    from response_cache import ResponseCache
+    
+    bridge = ACPLettaBridge(BridgeConfig())
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.send_message = AsyncMock(return_value=AgentResponse("return 1"))
+    
+    request = {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "def f():", "context": {"b": 1, "a": 2}}, "id": 1}
+    first = await bridge.handle_request(request)
+    request["params"]["context"] = {"a": 2, "b": 1}
+    second = await bridge.handle_request(request)
+    assert bridge.letta_client.send_message.await_count == 1
+    assert second["result"]["completion"] == first["result"]["completion"]
+    assert second["result"]["metadata"]["cached"] is True
+    assert bridge.response_cache.stats()["hits"] == 1
+    print("✓ Repeat completion skipped the Letta call")
+    
+    request["params"]["cursor"] = {"line": 4}
+    await bridge.handle_request(request)
+    assert bridge.letta_client.send_message.await_count == 2
+    print("✓ Completions differing only in cursor are cached apart")
+    
+    cache = ResponseCache(max_size=2, ttl=0)
+    cache.put("k", {"text": "x"})
+    assert cache.get("k") is None
+    cache = ResponseCache(max_size=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {})
+    assert cache.get("a") is None and cache.get("c") == {}
+    print("✓ Entries expire and evict least recently used")
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    assert bridge.response_cache is None
+    print("✓ Cache can be disabled")
+    
+    return True
+
+async def test_agent_id_cache():
+    """Test warm starts resolve the agent from the on-disk cache"""
+    print("\nTesting agent id cache...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        config = BridgeConfig(agent_cache_path=os.path.join(tmp, "agents.json"))
+        
+        cold = LettaClientWrapper(config)
+        cold.client = Mock()
+        agent = Mock(id="agent-1")
+        agent.name = "coder"
+        cold.client.agents.list = Mock(return_value=[agent])
+        assert await cold.get_or_create_agent("coder", {}) == "agent-1"
+        cold.client.agents.list.assert_called_once_with(name="coder", limit=10)
+        print("✓ Cold start uses name-filtered lookup")
+        
+        warm = LettaClientWrapper(config)
+        warm.client = Mock()
+        warm.client.agents.retrieve = Mock(return_value=agent)
+        assert await warm.get_or_create_agent("coder", {}) == "agent-1"
+        warm.client.agents.retrieve.assert_called_once_with("agent-1")
+        warm.client.agents.list.assert_not_called()
+        print("✓ Warm start validated with a single GET")
+        
+        stale = LettaClientWrapper(config)
+        stale.client = Mock()
+        stale.client.agents.retrieve = Mock(return_value=Mock(id="agent-1"))
+        stale.client.agents.list = Mock(return_value=[])
+        stale.client.agents.create = Mock(return_value=Mock(id="agent-2"))
+        assert await stale.get_or_create_agent("coder", {}) == "agent-2"
+        assert stale.agent_cache.get("coder") == "agent-2"
+        assert stale.client.agents.create.call_args.kwargs["name"] == "coder"
+        print("✓ Stale cache entry replaced by an agent created under the same name")
+        
+        for client in (cold, warm, stale):
+            await client.disconnect()
+    
+    return True
+
+async def test_http_pool_config():
+    """Test connect wires pool limits into the client and warms it up"""
+    print("\nTesting HTTP pool configuration...")
+    
+    config = BridgeConfig(http_max_connections=4, http_keepalive_expiry=15, http_connect_timeout=2)
+    with patch('letta_wrapper.Letta') as MockLetta:
+        client = LettaClientWrapper(config)
+        await client.connect()
+        
+        http_client = MockLetta.call_args.kwargs["http_client"]
+        assert http_client is client.http_client
+        assert http_client._transport._pool._max_connections == 4
+        assert http_client._transport._pool._keepalive_expiry == 15
+        assert http_client.timeout.connect == 2
+        MockLetta.return_value.health.assert_called_once()
+        print("✓ Pool limits and timeouts applied, warm-up request sent")
+        
+        await client.disconnect()
+        assert http_client.is_closed
+    
+    return True
+
+async def test_daemon_sessions():
+    """Test the daemon serves several sessions with one shared client"""
+    print("\nTesting daemon sessions...")
+    
+    from daemon import BridgeDaemon, open_daemon_connection
+    from framing import FrameDecoder, encode_frame
+    
+    with tempfile.TemporaryDirectory() as tmp, patch('letta_wrapper.Letta') as MockLetta:
+        MockLetta.return_value.agents.list = Mock(return_value=[])
+        MockLetta.return_value.agents.create = Mock(return_value=Mock(id="test-agent-123"))
+        
+        config = BridgeConfig(daemon_socket=os.path.join(tmp, "bridge.sock"))
+        daemon = BridgeDaemon(config)
+        await daemon.start()
+        
+        async def session(request_id):
+            reader, writer = await open_daemon_connection(config)
+            request = {"jsonrpc": "2.0", "method": "initialize", "id": request_id}
+            writer.write(encode_frame(json.dumps(request).encode()))
+            writer.write_eof()
+            decoder = FrameDecoder()
+            decoder.feed(await reader.read())
+            writer.close()
+            return json.loads(decoder.next_frame())
+        
+        responses = await asyncio.gather(session(1), session(2))
+        assert [r["id"] for r in responses] == [1, 2]
+        assert MockLetta.call_count == 1
+        print("✓ Two sessions answered over the Unix socket")
+        
+        await daemon.stop()
+        assert not os.path.exists(config.daemon_socket)
+        print("✓ Socket removed on stop")
+    
+    return True
+
+async def test_method_registry():
+    """Test the registry serves MessageHandler methods and rejects unknown ones"""
+    print("\nTesting method registry...")
+    
+    bridge = ACPLettaBridge(BridgeConfig())
+    bridge.letta_client.agents["coder"] = "agent-1"
+    
+    response = await bridge.handle_request({"jsonrpc": "2.0", "method": "agent/list", "id": 1})
+    assert response["result"] == {"agents": ["coder"], "count": 1}
+    print("✓ agent/list reached MessageHandler")
+    
+    response = await bridge.handle_request({"jsonrpc": "2.0", "method": "agent/unknown", "id": 2})
+    assert response["error"]["code"] == -32601
+    print("✓ Unknown method rejected with -32601")
+    
+    from dispatcher import PrioritySemaphore
+    
+    slots = PrioritySemaphore(1)
+    await slots.acquire()
+    order = []
+    async def waiter(priority):
+        await slots.acquire(priority)
+        order.append(priority)
+        slots.release()
+    waiters = [asyncio.create_task(waiter(p)) for p in (3, 1, 2)]
+    await asyncio.sleep(0)
+    slots.release()
+    await asyncio.gather(*waiters)
+    assert order == [1, 2, 3]
+    print("✓ Freed slots go to the highest priority waiter")
+    
+    return True
+
+async def test_agent_pool():
+    """Test the agent pool enforces max_agents and per-agent limits"""
+    print("\nTesting agent pool...")
+    
+    from agent_pool import AgentPool
+    
+    config = BridgeConfig(max_agents=2, max_requests_per_agent=1)
+    pool = AgentPool(config, LettaClientWrapper(config))
+    pool.admit("agent-default", "default", pinned=True)
+    pool.admit("agent-a", "a")
+    pool.admit("agent-b", "b")
+    assert [a["agent_id"] for a in pool.stats()["agents"]] == ["agent-default", "agent-b"]
+    assert pool.stats()["evictions"] == 1
+    print("✓ LRU idle agent evicted, pinned agent kept")
+    
+    async with pool.use("agent-b"):
+        try:
+            pool.admit("agent-c", "c")
+            assert False, "expected full pool"
+        except RuntimeError:
+            pass
+        assert pool.stats()["busy"] == 1
+    print("✓ Busy agents are never evicted")
+    
+    order = []
+    async def call(tag):
+        async with pool.use("agent-b"):
+            order.append(f"start-{tag}")
+            await asyncio.sleep(0.01)
+            order.append(f"end-{tag}")
+    await asyncio.gather(call(1), call(2))
+    assert order == ["start-1", "end-1", "start-2", "end-2"]
+    print("✓ Per-agent in-flight cap enforced")
+    
+    from agent_pool import AgentQueue
+    queue = AgentQueue(1)
+    await queue.acquire()
+    waiter = asyncio.create_task(queue.acquire("k"))
+    await asyncio.sleep(0)
+    queue._supersede("k")
+    waiter.cancel()
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        pass
+    assert queue.active == 1
+    print("✓ Superseded then cancelled waiter gives back no turn")
+    
+    return True
+
+async def test_completion_coalescing():
+    """Test queued completions at the same cursor are superseded"""
+    print("\nTesting completion coalescing...")
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    
+    sent = []
+    async def slow_send(agent_id, message):
+        sent.append(message)
+        await asyncio.sleep(0.05)
+        return AgentResponse("ok")
+    bridge.letta_client.send_message = slow_send
+    
+    def complete(request_id, prompt):
+        return bridge.handle_request({
+            "jsonrpc": "2.0", "method": "agent/complete", "id": request_id,
+            "params": {"prompt": prompt, "context": {"filePath": "a.py", "cursor": {"line": 3, "character": len(prompt)}}}
+        })
+    
+    first = asyncio.create_task(complete(1, "d"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(complete(2, "de"))
+    await asyncio.sleep(0)
+    third = asyncio.create_task(complete(3, "def"))
+    results = [r["result"] for r in await asyncio.gather(first, second, third)]
+    
+    assert results[1]["superseded"] is True
+    assert "superseded" not in results[0] and "superseded" not in results[2]
+    assert len(sent) == 2
+    stats = bridge.agent_pool.stats()["agents"][0]
+    assert stats["superseded"] == 1 and stats["queued"] == 0
+    print("✓ Older queued completion answered as superseded")
+    
+    return True
+
+async def test_agent_ordering():
+    """Test an agent's requests reach Letta in arrival order across methods"""
+    print("\nTesting per-agent ordering...")
+    
+    bridge = ACPLettaBridge(BridgeConfig(max_concurrent_requests=1, enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    
+    sent = []
+    async def slow_send(agent_id, message):
+        sent.append(next(tag for tag in ("first", "second", "third") if tag in message))
+        await asyncio.sleep(0.02)
+        return AgentResponse("ok")
+    bridge.letta_client.send_message = slow_send
+    
+    written = []
+    async def capture(message):
+        written.append(message)
+    bridge.write_message = capture
+    
+    for request_id, tag in enumerate(["first", "second"], 1):
+        await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/message", "id": request_id,
+                               "params": {"agent_id": "test-agent-123", "message": tag}})
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/complete", "id": 3, "params": {"prompt": "third"}})
+    await bridge.drain()
+    assert sent == ["first", "second", "third"]
+    assert all("result" in m for m in written)
+    assert bridge.agent_pool.stats()["busy"] == 0
+    print("✓ Higher-priority completion waits behind the agent's earlier messages")
+    
+    import time
+    bridge = ACPLettaBridge(BridgeConfig(max_concurrent_requests=4))
+    bridge.agent_id = "test-agent-123"
+    
+    async def send(agent_id, message):
+        await asyncio.sleep(0.2 if agent_id == "agent-a" else 0.01)
+        return AgentResponse("ok")
+    bridge.letta_client.send_message = send
+    
+    finished = {}
+    started = time.perf_counter()
+    async def capture(message):
+        finished[message["id"]] = time.perf_counter() - started
+    bridge.write_message = capture
+    
+    for request_id in range(1, 7):
+        await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/message", "id": request_id,
+                               "params": {"agent_id": "agent-a", "message": "busy"}})
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/message", "id": 7,
+                           "params": {"agent_id": "agent-b", "message": "quick"}})
+    await asyncio.sleep(0.1)
+    assert 7 in finished and finished[7] < 0.1
+    for task in list(bridge._tasks):
+        task.cancel()
+    await bridge.drain()
+    print("✓ Requests queued behind a busy agent hold no shared slot")
+    
+    bridge = ACPLettaBridge(BridgeConfig(max_agents=1))
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.send_message = send
+    written = []
+    async def collect(message):
+        written.append(message)
+    bridge.write_message = collect
+    for request_id, agent_id in enumerate(("agent-a", "agent-b"), 1):
+        await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/message", "id": request_id,
+                               "params": {"agent_id": agent_id, "message": "hi"}})
+    await asyncio.wait_for(bridge.drain(), timeout=1)
+    responses = {m["id"]: m for m in written}
+    assert "result" in responses[1] and "Agent pool full" in responses[2]["error"]["message"]
+    print("✓ Request to a full pool answered with a JSON-RPC error")
+    
+    return True
+
+async def test_message_batching():
+    """Test queued messages for one agent go out as one Letta call"""
+    print("\nTesting message batching...")
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_batching=True, enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.send_messages = AsyncMock(return_value=AgentResponse(
+        "[batch item 1]\nfirst\n[batch item 2]\nsecond"
+    ))
+    
+    responses = await asyncio.gather(*[
+        bridge.handle_request({"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": p}, "id": i})
+        for i, p in enumerate(("a", "b"), 1)
+    ])
+    assert bridge.letta_client.send_messages.await_count == 1
+    sent = bridge.letta_client.send_messages.await_args.args[1]
+    assert len(sent) == 3 and sent[1].startswith("[batch item 1]")
+    assert [r["result"]["completion"] for r in responses] == ["first", "second"]
+    print("✓ Two completions answered from one batched call")
+    
+    bridge.letta_client.send_messages.return_value = AgentResponse("no markers")
+    bridge.letta_client.send_message = AsyncMock(side_effect=lambda agent_id, message: AgentResponse(f"answer {message}"))
+    responses = await asyncio.gather(*[
+        bridge.handle_request({"jsonrpc": "2.0", "method": "agent/message", "id": i,
+                               "params": {"agent_id": "test-agent-123", "message": m}})
+        for i, m in enumerate(("a", "b"), 3)
+    ])
+    assert [r["result"]["response"] for r in responses] == ["answer a", "answer b"]
+    assert bridge.batcher.stats()["split_failures"] == 1
+    print("✓ Unsplittable reply resent message by message")
+    
+    pending = asyncio.create_task(bridge.batcher.send("test-agent-123", "late"))
+    await asyncio.sleep(0)
+    await bridge.batcher.close()
+    assert pending.done() and not bridge.batcher._flushes
+    print("✓ Close sends collecting batches and waits for their flush tasks")
+    
+    return True
+
+async def test_prompt_budget():
+    """Test oversized completion and edit prompts are cut to the budget"""
+    print("\nTesting prompt budget...")
+    
+    bridge = ACPLettaBridge(BridgeConfig(
+        prompt_max_bytes=4000, prompt_window_lines=5, enable_response_cache=False
+    ))
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.send_message = AsyncMock(return_value=AgentResponse("ok"))
+    
+    document = "\n".join(f"line {i} " + "x" * 40 for i in range(1000))
+    response = await bridge.handle_request({
+        "jsonrpc": "2.0",
+        "method": "agent/complete",
+        "params": {
+            "prompt": "def f(",
+            "context": {"filePath": "a.py", "cursor": {"line": 500}, "content": document,
+                        "diagnostics": ["warn"] * 200, "notes": "y" * 3000}
+        },
+        "id": 1
+    })
+    sent = bridge.letta_client.send_message.await_args.args[1]
+    info = response["result"]["metadata"]["prompt"]
+    assert len(sent.encode()) <= 4000 and "line 500 " in sent and "line 100 " not in sent
+    assert info["dropped_keys"] == ["diagnostics"] and info["trimmed_bytes"] > 40000
+    print("✓ Completion context windowed around the cursor")
+    
+    response = await bridge.handle_request({
+        "jsonrpc": "2.0",
+        "method": "agent/edit",
+        "params": {"instruction": "rename", "code": document, "filePath": "a.py",
+                   "range": {"start": {"line": 10}, "end": {"line": 12}}},
+        "id": 2
+    })
+    sent = bridge.letta_client.send_message.await_args.args[1]
+    assert len(sent.encode()) <= 4000 and "line 11 " in sent
+    assert response["result"]["metadata"]["edit_range"] == {"start_line": 5, "end_line": 18}
+    lines = document.split("\n")
+    assert response["result"]["edit"] == "\n".join(lines[:5] + ["ok"] + lines[18:])
+    print("✓ Edit prompt cut to a window around the edit range")
+    print("✓ Edited window spliced back into the whole code")
+    
+    return True
+
+async def test_document_sync():
+    """Test incremental document sync and diff-based edit responses"""
+    print("\nTesting document sync...")
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.send_message = AsyncMock(return_value=AgentResponse("a = 1\nb = 20\nc = 3\n"))
+    
+    def request(method, params, request_id):
+        return bridge.handle_request({"jsonrpc": "2.0", "method": method, "params": params, "id": request_id})
+    
+    await request("document/open", {"uri": "file:///a.py", "text": "a = 1\nb = 2\n", "version": 1}, 1)
+    response = await request("document/change", {
+        "uri": "file:///a.py",
+        "version": 2,
+        "changes": [{"range": {"start": {"line": 2, "character": 0}, "end": {"line": 2, "character": 0}},
+                     "text": "c = 3\n"}]
+    }, 2)
+    assert response["result"]["version"] == 2
+    assert bridge.documents.get("file:///a.py").text == "a = 1\nb = 2\nc = 3\n"
+    print("✓ Incremental change applied to the stored document")
+    
+    response = await request("agent/edit", {"uri": "file:///a.py", "version": 2, "instruction": "b = 20"}, 3)
+    result = response["result"]
+    assert "edit" not in result and result["version"] == 2
+    assert result["edits"] == [{
+        "range": {"start": {"line": 1, "character": 0}, "end": {"line": 2, "character": 0}},
+        "newText": "b = 20\n"
+    }]
+    assert "c = 3" in bridge.letta_client.send_message.await_args.args[1]
+    print("✓ Edit answered with a minimal text edit")
+    
+    await request("document/open", {"uri": "file:///b.py", "text": "a\n# \x0c page\nb\nc\n", "version": 1}, 5)
+    bridge.letta_client.send_message.return_value = AgentResponse("```python\na\n# \x0c page\nb\nC\n```")
+    response = await request("agent/edit", {"uri": "file:///b.py", "instruction": "c = C"}, 6)
+    assert response["result"]["edits"] == [{
+        "range": {"start": {"line": 3, "character": 0}, "end": {"line": 4, "character": 0}},
+        "newText": "C\n"
+    }]
+    print("✓ Only newlines split lines; code fences stripped from the reply")
+    
+    # An edit queued behind a slow request still diffs against the text
+    # the client saw, however many changes arrive meanwhile
+    async def slow_send(agent_id, message):
+        await asyncio.sleep(0.05)
+        return AgentResponse("x = 1\ny = 20\n")
+    bridge.letta_client.send_message = slow_send
+    written = []
+    async def capture(message):
+        written.append(message)
+    bridge.write_message = capture
+    await request("document/open", {"uri": "file:///c.py", "text": "x = 1\ny = 2\n", "version": 1}, 7)
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/message", "id": 8,
+                           "params": {"agent_id": "test-agent-123", "message": "busy"}})
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/edit", "id": 9,
+                           "params": {"uri": "file:///c.py", "version": 1, "instruction": "y = 20"}})
+    await bridge.dispatch({"jsonrpc": "2.0", "method": "agent/edit", "id": 10,
+                           "params": {"uri": "file:///c.py", "instruction": "y = 20"}})
+    for version in range(2, 7):
+        await bridge.dispatch({"jsonrpc": "2.0", "method": "document/change", "id": 10 + version,
+                               "params": {"uri": "file:///c.py", "version": version,
+                                          "changes": [{"text": f"x = 1\ny = 2\n# v{version}\n"}]}})
+    await bridge.drain()
+    responses = {m["id"]: m["result"] for m in written}
+    for request_id in (9, 10):
+        assert responses[request_id]["version"] == 1
+        assert responses[request_id]["edits"] == [{
+            "range": {"start": {"line": 1, "character": 0}, "end": {"line": 2, "character": 0}},
+            "newText": "y = 20\n"
+        }]
+    print("✓ Queued edit diffs against the document version it was sent with")
+    
+    response = await request("document/change", {"uri": "file:///a.py", "version": 2, "changes": []}, 4)
+    assert "error" in response
+    print("✓ Stale document version rejected")
+    
+    return True
+
+async def test_json_codec():
+    """Test codec selection, malformed frames and typed params"""
+    print("\nTesting JSON codec...")
+    
+    from codec import get_codec, JSONCodec
+    
+    message = {"id": 1, "result": {"completion": "naïve → 完成"}}
+    for name in ("json", "orjson", "msgspec"):
+        codec = get_codec(name)
+        body = codec.dumps(message)
+        assert isinstance(body, bytes) and codec.loads(body) == message
+        try:
+            codec.loads(b"{not json")
+            assert False, "malformed JSON decoded"
+        except ValueError:
+            pass
+    assert type(get_codec("json")) is JSONCodec
+    print(f"✓ Codecs round-trip bytes (auto picks {get_codec().name})")
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    written = []
+    
+    async def capture(message):
+        written.append(message)
+    
+    bridge.write_message = capture
+    transport = Mock()
+    transport.read_message = AsyncMock(side_effect=[
+        b"{not json",
+        b'{"jsonrpc": "2.0", "method": "agent/message", "params": {"message": "hi"}, "id": 2}',
+        None
+    ])
+    transport.last_read_time = 0.0
+    await bridge.serve(transport)
+    assert written[0]["error"]["code"] == -32700
+    assert written[1]["error"]["code"] == -32602 and "agent_id" in written[1]["error"]["message"]
+    print("✓ Malformed frame and invalid params get JSON-RPC errors")
+    
+    bridge.letta_client.send_message = AsyncMock(return_value=AgentResponse("hello"))
+    response = await bridge.handle_request({
+        "jsonrpc": "2.0", "method": "agent/message", "params": {"agent_id": "a-1", "message": "hi"}, "id": 3
+    })
+    assert response["result"]["agent_id"] == "a-1"
+    assert bridge.letta_client.send_message.await_args.args == ("a-1", "hi")
+    print("✓ agent/message params decoded into AgentMessageParams")
+    
+    return True
+
+async def test_lazy_startup():
+    """Test initialize is answered before Letta startup finishes"""
+    print("\nTesting lazy startup...")
+    
+    import subprocess
+    probe = subprocess.run(
+        [sys.executable, "-c", "import sys, acp_letta_bridge; print('letta_client' in sys.modules)"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    assert probe.stdout.strip() == "False"
+    print("✓ Importing the bridge does not import letta_client")
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    connected = asyncio.Event()
+    
+    async def slow_initialize():
+        await connected.wait()
+        bridge.agent_id = "test-agent-123"
+    
+    bridge.initialize = slow_initialize
+    bridge.letta_client.send_message = AsyncMock(return_value=AgentResponse("done"))
+    bridge.start_initialize()
+    
+    response = await asyncio.wait_for(bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "initialize", "params": {}, "id": 1}
+    ), timeout=1)
+    assert "capabilities" in response["result"]
+    
+    complete = asyncio.create_task(bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 2}
+    ))
+    await asyncio.sleep(0.05)
+    assert not complete.done()
+    connected.set()
+    response = await complete
+    assert response["result"]["metadata"]["agent_id"] == "test-agent-123"
+    print("✓ initialize answered immediately; agent requests wait for startup")
+    
+    from early_start import answer_initialize
+    from framing import FrameDecoder, encode_frame
+    initialize = encode_frame(b'{"jsonrpc": "2.0", "method": "initialize", "id": 1}')
+    later = encode_frame(b'{"jsonrpc": "2.0", "method": "agent/pool", "id": 2}')
+    for stdin, answered in ((initialize + later, True), (later + initialize, False)):
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        os.write(stdin_w, stdin)
+        os.close(stdin_w)
+        with patch.dict(os.environ, {"BRIDGE_ENABLE_STREAMING": "yes"}):
+            rest = answer_initialize(stdin_r, stdout_w)
+        os.close(stdout_w)
+        decoder = FrameDecoder()
+        decoder.feed(os.read(stdout_r, 65536))
+        body = decoder.next_frame()
+        for fd in (stdin_r, stdout_r):
+            os.close(fd)
+        if answered:
+            assert rest == later
+            expected = await ACPLettaBridge(BridgeConfig(enable_streaming=True))._handle_initialize({})
+            assert json.loads(body)["result"] == expected
+        else:
+            assert rest == stdin and body is None
+    print("✓ Entry point answers a leading initialize before loading the bridge")
+    
+    return True
+
+async def test_deferred_startup_retry():
+    """Test startup retries with backoff while requests fail fast"""
+    print("\nTesting deferred startup retry...")
+    
+    bridge = ACPLettaBridge(BridgeConfig(
+        enable_response_cache=False,
+        startup_retry_initial=0.01,
+        startup_retry_max=0.02,
+        startup_wait_timeout=0.05
+    ))
+    attempts = []
+    reachable = asyncio.Event()
+    
+    async def flaky_initialize():
+        attempts.append(1)
+        if not reachable.is_set():
+            raise ConnectionError("connection refused")
+        bridge.agent_id = "test-agent-123"
+    
+    bridge.initialize = flaky_initialize
+    bridge.letta_client.send_message = AsyncMock(return_value=AgentResponse("done"))
+    bridge.start_initialize()
+    
+    response = await bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 1}
+    )
+    assert response["error"]["code"] == -32002
+    assert len(attempts) >= 2 and not bridge._startup.done()
+    print("✓ Requests fail fast while Letta is unreachable; startup keeps retrying")
+    
+    reachable.set()
+    response = await bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 2}
+    )
+    assert response["result"]["completion"] == "done"
+    print("✓ Requests succeed once a retry connects")
+    
+    return True
+
+async def test_request_metrics():
+    """Test per-request spans feed the bridge/metrics quantiles"""
+    print("\nTesting request metrics...")
+    
+    from transport import StdioTransport
+    from framing import encode_frame
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    
+    def slow_create(**kwargs):
+        import time
+        time.sleep(0.02)
+        return Mock(messages=[], usage=None)
+    
+    bridge.letta_client.client = Mock()
+    bridge.letta_client.client.agents.messages.create = slow_create
+    
+    reader = asyncio.StreamReader()
+    writer = Mock()
+    writer.drain = AsyncMock()
+    for i in range(3):
+        request = {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": f"p{i}"}, "id": i}
+        reader.feed_data(encode_frame(json.dumps(request).encode()))
+    reader.feed_eof()
+    await bridge.serve(StdioTransport(reader, writer))
+    
+    response = await bridge.handle_request({"jsonrpc": "2.0", "method": "bridge/metrics", "params": {}, "id": 9})
+    stages = response["result"]["methods"]["agent/complete"]
+    assert set(stages) >= {"read", "decode", "queue", "letta", "extract", "encode", "write", "total"}
+    assert stages["total"]["count"] == 3 and stages["letta"]["p50_ms"] >= 20
+    assert stages["total"]["p99_ms"] >= stages["letta"]["p99_ms"]
+    assert response["result"]["agents"]["test-agent-123"]["letta"]["count"] == 3
+    print("✓ Stage quantiles recorded per method and per agent")
+    
+    response = await bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "bridge/metrics", "params": {"format": "prometheus"}, "id": 10}
+    )
+    text = response["result"]["text"]
+    assert 'lettabridge_request_stage_seconds_count{method="agent/complete",stage="letta"} 3' in text
+    print("✓ Prometheus text exposition")
+    
+    return True
+
+async def test_benchmark_harness():
+    """Test the fake Letta server and a short benchmark run"""
+    print("\nTesting benchmark harness...")
+    
+    from fake_letta import FakeLettaServer
+    from benchmark import run_benchmark
+    from letta_wrapper import LettaClientWrapper
+    
+    fake = FakeLettaServer(latency=0.001, token_rate=5000, reply_tokens=3)
+    client = LettaClientWrapper(BridgeConfig(letta_base_url=fake.start(), agent_cache_path=""))
+    try:
+        await client.connect()
+        agent_id = await client.get_or_create_agent("bench", {"persona": "x"})
+        client.agents.clear()
+        assert await client.get_or_create_agent("bench", {"persona": "x"}) == agent_id
+        print("✓ SDK talks to the fake server; agents are found again by name")
+    finally:
+        await client.disconnect()
+        fake.stop()
+    
+    report = await run_benchmark(
+        requests=6, concurrency=3, agents=2, latency=0.001, token_rate=5000, reply_tokens=3
+    )
+    assert report["overall"]["requests"] == 6 and report["overall"]["errors"] == 0
+    assert all("overhead_mean_ms" in m for m in report["methods"].values())
+    json.dumps(report)
+    print(f"✓ Benchmark report: {report['overall']['req_per_s']} req/s over stdio")
+    
+    return True
+
+async def test_session_replay():
+    """Test a recorded session replays with identical responses"""
+    print("\nTesting session record and replay...")
+    
+    import os
+    import tempfile
+    from transport import StdioTransport
+    from framing import encode_frame
+    from replay import replay, load_session
+    
+    path = os.path.join(tempfile.mkdtemp(), "session.jsonl")
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False, record_path=path))
+    bridge.letta_client._client.connect = AsyncMock()
+    bridge.letta_client._client.get_or_create_agent = AsyncMock(return_value="test-agent-123")
+    
+    async def send_messages(agent_id, messages):
+        await asyncio.sleep(0.01)
+        return AgentResponse(f"reply to {messages[-1]}")
+    
+    bridge.letta_client._client.send_messages = send_messages
+    with open(path, encoding="utf-8") as f:
+        assert json.loads(f.readline())["kind"] == "session"
+    print("✓ Log entries reach disk before the recorder is closed")
+    
+    reader = asyncio.StreamReader()
+    writer = Mock()
+    writer.drain = AsyncMock()
+    requests = [{"jsonrpc": "2.0", "method": "initialize", "params": {}, "id": 0}]
+    requests += [
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": f"p{i}"}, "id": i + 1}
+        for i in range(3)
+    ]
+    for request in requests:
+        reader.feed_data(encode_frame(json.dumps(request).encode()))
+    reader.feed_eof()
+    bridge.start_initialize()
+    await bridge.serve(StdioTransport(reader, writer))
+    
+    entries = load_session(path)
+    kinds = [e["kind"] for e in entries]
+    assert kinds.count("in") == 4 and kinds.count("out") == 4
+    assert kinds.count("letta") == 4 and all("duration" in e for e in entries if e["kind"] == "letta")
+    print("✓ Frames and Letta calls recorded with timings")
+    
+    report = await replay(path, speed=0, config=BridgeConfig(enable_response_cache=False))
+    assert report["responses"] == 4 and report["mismatched_responses"] == []
+    assert report["unmatched_letta_calls"] == 0
+    assert report["methods"]["agent/complete"]["count"] == 3
+    print(f"✓ Replay matched every response ({report['duration_s']}s at speed 0)")
+    
+    return True
+
+async def test_response_extraction():
+    """Test Letta messages are classified into a compact response in one pass"""
+    print("\nTesting response extraction...")
+    
+    from letta_messages import extract_response
+    
+    def tool_call(name, call_id):
+        call = Mock(tool_call_id=call_id, arguments="{}")
+        call.name = name  # Mock(name=...) names the mock itself
+        return Mock(message_type="tool_call_message", tool_calls=None, tool_call=call)
+    
+    response = Mock(messages=[
+        Mock(message_type="reasoning_message", reasoning="Look up the docs"),
+        tool_call("archival_memory_search", "c1"),
+        Mock(message_type="tool_return_message", tool_call_id="c1", status="success"),
+        tool_call("memory_replace", "c2"),
+        Mock(message_type="tool_return_message", tool_call_id="c2", status="error"),
+        Mock(message_type="assistant_message", content=[Mock(text="def "), Mock(text="f(): pass")]),
+        Mock(message_type="assistant_message", content="done")
+    ], usage=Mock(prompt_tokens=120, completion_tokens=30, total_tokens=150, step_count=2))
+    
+    result = extract_response(response)
+    assert result.text == "def f(): pass\ndone" and result.reasoning == "Look up the docs"
+    assert result.tool_calls == ["archival_memory_search", "memory_replace"]
+    assert result.memory_updated is False
+    assert result.usage.to_dict() == {
+        "prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150, "step_count": 2, "seconds": 0.0
+    }
+    assert result.raw is None and not hasattr(result, "__dict__")
+    print("✓ Text, reasoning, tool calls and usage extracted; failed memory edit ignored")
+    
+    response.messages.append(tool_call("core_memory_append", "c3"))
+    assert extract_response(response).memory_updated is True
+    assert extract_response(response, keep_raw=True).raw is response
+    print("✓ Memory edits detected by tool name; raw response kept only on request")
+    
+    return True
+
+async def test_usage_accounting():
+    """Test Letta usage is returned in metadata and totalled per method and agent"""
+    print("\nTesting usage accounting...")
+    
+    from transport import StdioTransport
+    from framing import encode_frame
+    from letta_messages import Usage
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.send_message = AsyncMock(side_effect=lambda agent_id, message: AgentResponse(
+        "ok", usage=Usage(prompt_tokens=100, completion_tokens=10, total_tokens=110, step_count=2, seconds=0.5)
+    ))
+    
+    response = await bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 1}
+    )
+    assert response["result"]["metadata"]["usage"]["total_tokens"] == 110
+    print("✓ Usage returned in response metadata")
+    
+    reader = asyncio.StreamReader()
+    writer = Mock()
+    writer.drain = AsyncMock()
+    requests = [
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "a"}, "id": 2},
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "b"}, "id": 3},
+        {"jsonrpc": "2.0", "method": "agent/message", "params": {"agent_id": "a-2", "message": "hi"}, "id": 4}
+    ]
+    for request in requests:
+        reader.feed_data(encode_frame(json.dumps(request).encode()))
+    reader.feed_eof()
+    await bridge.serve(StdioTransport(reader, writer))
+    
+    response = await bridge.handle_request({"jsonrpc": "2.0", "method": "bridge/usage", "params": {}, "id": 5})
+    usage = response["result"]
+    assert usage["methods"]["agent/complete"]["total_tokens"] == 220
+    assert usage["methods"]["agent/complete"]["step_ms"] == 250.0
+    assert usage["agents"]["a-2"]["requests"] == 1 and usage["total"]["total_tokens"] == 330
+    response = await bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "bridge/usage", "params": {"agent_id": "a-2"}, "id": 6}
+    )
+    assert list(response["result"]["agents"]) == ["a-2"]
+    assert 'lettabridge_tokens_total{method="agent/complete",type="prompt"} 200' in bridge.metrics.prometheus_text()
+    print("✓ Token and step totals per method and agent via bridge/usage")
+    
+    return True
+
+async def test_memory_cache():
+    """Test memory blocks are cached until an edit, which pushes only changed blocks"""
+    print("\nTesting memory block cache...")
+    
+    def block(label, value):
+        return Mock(label=label, value=value, limit=5000, description=None)
+    
+    blocks = [block("persona", "helpful"), block("human", "likes tests")]
+    edit = Mock(tool_call_id="c1", arguments="{}")
+    edit.name = "memory_replace"
+    
+    bridge = ACPLettaBridge(BridgeConfig(enable_response_cache=False))
+    bridge.agent_id = "test-agent-123"
+    bridge.letta_client.client = Mock()
+    bridge.letta_client.client.agents.blocks.list = Mock(side_effect=lambda agent_id: list(blocks))
+    bridge.letta_client.client.agents.messages.create = Mock(return_value=Mock(messages=[
+        Mock(message_type="tool_call_message", tool_calls=None, tool_call=edit),
+        Mock(message_type="assistant_message", content="noted")
+    ], usage=None))
+    bridge.letta_client.memory_listeners.append(bridge._on_memory_updated)
+    
+    written = []
+    async def capture(message):
+        written.append(message)
+    bridge.write_message = capture
+    
+    request = {"jsonrpc": "2.0", "method": "agent/memory", "params": {}, "id": 1}
+    response = await bridge.handle_request(request)
+    assert [b["label"] for b in response["result"]["blocks"]] == ["persona", "human"]
+    await bridge.handle_request(dict(request, id=2))
+    assert bridge.letta_client.client.agents.blocks.list.call_count == 1
+    print("✓ Memory blocks served from cache on repeat reads")
+    
+    blocks[1] = block("human", "likes fast tests")
+    response = await bridge.handle_request(
+        {"jsonrpc": "2.0", "method": "agent/complete", "params": {"prompt": "x"}, "id": 3}
+    )
+    assert response["result"]["metadata"]["memory_updated"] is True
+    await asyncio.gather(*bridge._memory_refreshes.values())
+    assert bridge.letta_client.client.agents.blocks.list.call_count == 2
+    assert [m["method"] for m in written] == ["agent/memoryChanged"]
+    assert written[0]["params"]["blocks"] == [
+        {"label": "human", "value": "likes fast tests", "limit": 5000, "description": None}
+    ]
+    print("✓ Memory edit invalidates the cache and pushes only the changed block")
+    
+    await bridge.handle_request(dict(request, id=4))
+    assert bridge.letta_client.client.agents.blocks.list.call_count == 2
+    print("✓ Refreshed blocks reused by the next read")
+    
+    return True
+
 async def run_tests():
     """Run all tests"""
     print("=" * 50)
@@ -118,6 +1299,7 @@ async def run_tests():
     test_config()
     if not test_imports():
         return False
+    test_framing_codec()
     
     # Async tests
     if not await test_bridge_initialization():
@@ -126,12 +1308,86 @@ async def run_tests():
     if not await test_request_handling():
         return False
     
+    if not await test_concurrent_dispatch():
+        return False
+    
+    if not await test_transport_framing():
+        return False
+    
+    if not await test_sdk_off_event_loop():
+        return False
+    
+    if not await test_streaming_completion():
+        return False
+    
+    if not await test_cancel_inflight():
+        return False
+    
+    if not await test_completion_cache():
+        return False
+    
+    if not await test_agent_id_cache():
+        return False
+    
+    if not await test_http_pool_config():
+        return False
+    
+    if not await test_daemon_sessions():
+        return False
+    
+    if not await test_method_registry():
+        return False
+    
+    if not await test_agent_pool():
+        return False
+    
+    if not await test_completion_coalescing():
+        return False
+    
+    if not await test_agent_ordering():
+        return False
+    
+    if not await test_message_batching():
+        return False
+    
+    if not await test_prompt_budget():
+        return False
+    
+    if not await test_document_sync():
+        return False
+    
+    if not await test_json_codec():
+        return False
+    
+    if not await test_lazy_startup():
+        return False
+    
+    if not await test_deferred_startup_retry():
+        return False
+    
+    if not await test_request_metrics():
+        return False
+    
+    if not await test_benchmark_harness():
+        return False
+    
+    if not await test_session_replay():
+        return False
+    
+    if not await test_response_extraction():
+        return False
+    
+    if not await test_usage_accounting():
+        return False
+    
+    if not await test_memory_cache():
+        return False
+    
     print("\n" + "=" * 50)
     print("✓ All tests passed!")
     print("=" * 50)
     return True
 
 if __name__ == "__main__":
-    import asyncio
     result = asyncio.run(run_tests())
     sys.exit(0 if result else 1)
@@ -0,0 +1,129 @@
+"""
+Async stdio transport
+Content-Length framed JSON-RPC over asyncio streams
+"""
+
+import sys
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+from acp_protocol import ACPHandler, PARSE_ERROR
+from framing import FrameDecoder, FrameError, encode_frame
+from codec import JSONCodec, get_codec
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Chunk size for reads from stdin
+READ_LIMIT = 2 ** 16
+
+
+class BlockingWriter:
+    """Writer fallback for stdout that is not a pipe (file, some terminals)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data: bytes):
+        self.stream.write(data)
+
+    async def drain(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class StdioTransport:
+    """Read and write Content-Length framed messages on asyncio streams"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer, codec: Optional[JSONCodec] = None):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec or get_codec()
+        # Seconds from the first chunk of the last frame to its last byte
+        self.last_read_time = 0.0
+        self.decoder = FrameDecoder()
+        self._write_lock = asyncio.Lock()
+
+    @classmethod
+    async def open_stdio(cls) -> "StdioTransport":
+        """Attach non-blocking streams to the process stdin/stdout"""
+        loop = asyncio.get_running_loop()
+
+        reader = asyncio.StreamReader(limit=READ_LIMIT)
+        try:
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+            )
+        except (ValueError, OSError):
+            # Regular files cannot be registered with the event loop;
+            # feed the reader from a worker thread instead
+            logger.debug("stdin is not a pipe, reading in a thread")
+            loop.run_in_executor(None, cls._pump_stdin, loop, reader)
+
+        try:
+            transport, protocol = await loop.connect_write_pipe(
+                asyncio.streams.FlowControlMixin, sys.stdout
+            )
+            writer = asyncio.StreamWriter(transport, protocol, None, loop)
+        except (ValueError, OSError):
+            logger.debug("stdout is not a pipe, using blocking writes")
+            writer = BlockingWriter(sys.stdout.buffer)
+
+        return cls(reader, writer)
+
+    @staticmethod
+    def _pump_stdin(loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader):
+        """Copy stdin into a StreamReader from a worker thread"""
+        stream = sys.stdin.buffer
+        while True:
+            data = stream.read1(READ_LIMIT)
+            if not data:
+                loop.call_soon_threadsafe(reader.feed_eof)
+                return
+            loop.call_soon_threadsafe(reader.feed_data, data)
+
+    async def read_message(self) -> Optional[bytes]:
+        """
+        Read one Content-Length framed message body
+
+        Returns None at end of stream or on a truncated frame. A frame
+        with a bad header is answered with a parse error and skipped.
+        """
+        first_chunk = None
+        while True:
+            try:
+                body = self.decoder.next_frame()
+            except FrameError as e:
+                logger.warning(f"Dropping malformed frame: {e}")
+                await self.write_message(ACPHandler.error_response(None, "Parse error", code=PARSE_ERROR))
+                continue
+            if body is not None:
+                self.last_read_time = time.perf_counter() - first_chunk if first_chunk else 0.0
+                return body
+            data = await self.reader.read(READ_LIMIT)
+            if not data:
+                if self.decoder.buffered:
+                    logger.warning("Stream ended inside a message")
+                return None
+            if first_chunk is None:
+                first_chunk = time.perf_counter()
+            self.decoder.feed(data)
+
+    async def write_message(self, message: Dict[str, Any]):
+        """Write a JSON-RPC message; drains only when the buffer is full"""
+        await self.write_frame(self.codec.dumps(message))
+
+    async def write_frame(self, body: bytes):
+        """Write an already encoded message body"""
+        frame = encode_frame(body)
+        with timed("write"):
+            async with self._write_lock:
+                self.writer.write(frame)
+                await self.writer.drain()
+
+    def close(self):
+        """Close the write side"""
+        self.writer.close()